@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        from api import checks, signals  # noqa: F401
+
+        pdfmetrics.registerFont(
+            TTFont('typeface', settings.PDF_FONT_PATH, 'UTF-8'))
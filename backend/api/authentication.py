@@ -0,0 +1,179 @@
+"""Авторизация без запроса к базе на каждый запрос API.
+
+Токен DRF с пользователем (и пользователь по id для JWT) ищется
+сначала в LRU процесса (короткий TTL), затем в общем кэше и только
+потом в базе. Записи удаляются при выходе, смене пароля,
+деактивации и любом другом сохранении пользователя (api.signals).
+LRU других процессов узнаёт об этом не позже чем через
+AUTH_TOKEN_LOCAL_TTL секунд. С locmem (SHARED_CACHE выключен) кэш
+по умолчанию у каждого процесса свой и удаление в нём другим
+процессам не видно, поэтому используется только LRU.
+
+JWT (при JWT_AUTH) проверяются по подписи, отозванные jti и время
+отзыва всех токенов пользователя хранятся в кэше, поэтому JWT_AUTH
+без SHARED_CACHE не проходит проверку api.checks.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.constant import (AUTH_TOKEN_CACHE_TIMEOUT, AUTH_TOKEN_LOCAL_SIZE,
+                          AUTH_TOKEN_LOCAL_TTL)
+from users.models import User
+
+
+class LRUCache:
+    """Ограниченный по размеру словарь с временем жизни записей."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + self.ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+local_cache = LRUCache(AUTH_TOKEN_LOCAL_SIZE, AUTH_TOKEN_LOCAL_TTL)
+
+
+def token_cache_key(key):
+    """Ключ кэша по хэшу, чтобы сам токен не хранился в кэше открыто."""
+
+    return 'auth_token_' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'auth_user_{user_id}'
+
+
+def forget(cache_keys):
+    for cache_key in cache_keys:
+        local_cache.delete(cache_key)
+    cache.delete_many(cache_keys)
+
+
+def forget_tokens(keys):
+    forget([token_cache_key(key) for key in keys])
+
+
+def forget_user(user_id):
+    forget([user_cache_key(user_id)])
+
+
+def cached(cache_key, load):
+    """Значение из LRU, общего кэша или load(); None не кэшируется."""
+
+    value = local_cache.get(cache_key)
+    if value is not None:
+        return value
+    if settings.SHARED_CACHE:
+        value = cache.get(cache_key)
+    if value is None:
+        value = load()
+        if value is None:
+            return None
+        if settings.SHARED_CACHE:
+            cache.set(cache_key, value, AUTH_TOKEN_CACHE_TIMEOUT)
+    local_cache.set(cache_key, value)
+    return value
+
+
+def cached_user(user_id):
+    """Активный пользователь по id или None."""
+
+    return cached(
+        user_cache_key(user_id),
+        User.objects.filter(pk=user_id, is_active=True).first,
+    )
+
+
+def revoke_token(token):
+    """Отзыв JWT до истечения его срока."""
+
+    timeout = max(1, int(token['exp'] - time.time()))
+    cache.set(f'jwt_revoked_{token["jti"]}', True, timeout)
+
+
+def revoke_user_tokens(user_id):
+    """Отзыв всех JWT пользователя, выданных до этого момента."""
+
+    cache.set(
+        f'jwt_revoked_before_{user_id}', int(time.time()),
+        int(jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def is_revoked(token):
+    user_id = token[jwt_settings.USER_ID_CLAIM]
+    revoked = cache.get_many([
+        f'jwt_revoked_{token["jti"]}', f'jwt_revoked_before_{user_id}'
+    ])
+    revoked_before = revoked.get(f'jwt_revoked_before_{user_id}')
+    return (
+        f'jwt_revoked_{token["jti"]}' in revoked
+        or (revoked_before is not None and token['iat'] <= revoked_before)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = cached(token_cache_key(key), lambda: self.load_token(key))
+        return token.user, token
+
+    def load_token(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT с проверкой отзыва и пользователем из кэша."""
+
+    def get_user(self, validated_token):
+        if is_revoked(validated_token):
+            raise InvalidToken(_('Token is revoked.'))
+        user = cached_user(validated_token[jwt_settings.USER_ID_CLAIM])
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user
@@ -0,0 +1,320 @@
+"""Нагрузочный прогон API.
+
+Запросы берутся из коллекции Postman (*.json) и из файлов смеси
+запросов (*.jsonl, по объекту на строку: method, url, weight,
+auth, body). Переменные вида {{recipeId}} подставляются из базы.
+Запросы выполняются тестовым клиентом Django в этом же процессе
+или отправляются на запущенный сервер (base_url).
+"""
+import json
+import math
+import re
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+VARIABLE = re.compile(r'{{\s*(\w+)\s*}}')
+# Сколько последних объектов каждого вида подставлять в запросы.
+SAMPLE_SIZE = 1000
+
+
+class Entry:
+    """Один запрос смеси."""
+
+    def __init__(self, method, url, weight=1, auth=True, body=None,
+                 name=None):
+        self.method = method.upper()
+        self.url = url
+        self.weight = weight
+        self.auth = auth
+        self.body = body
+        self.name = name or f'{self.method} {url}'
+
+    @property
+    def safe(self):
+        return self.method in SAFE_METHODS
+
+
+def postman_entries(path):
+    """Запросы коллекции Postman с учётом наследования авторизации."""
+
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+
+    def walk(items, auth):
+        for item in items:
+            item_auth = item.get('auth', auth)
+            if 'item' in item:
+                yield from walk(item['item'], item_auth)
+                continue
+            request = item['request']
+            request_auth = request.get('auth', item_auth)
+            headers = {
+                header['key'].lower() for header in request.get('header', [])
+            }
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            body = (request.get('body') or {}).get('raw')
+            yield Entry(
+                request['method'],
+                VARIABLE.sub(
+                    lambda match: '' if match[1] == 'baseUrl' else match[0],
+                    url,
+                ),
+                auth=(
+                    'authorization' in headers
+                    or bool(request_auth and request_auth['type'] != 'noauth')
+                ),
+                body=body or None,
+                name=item['name'],
+            )
+
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', [])
+    }
+    return list(walk(collection['item'], collection.get('auth'))), variables
+
+
+def mix_entries(path):
+    entries = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                body = record.get('body')
+                if body is not None and not isinstance(body, str):
+                    body = json.dumps(body)
+                entries.append(Entry(
+                    record.get('method', 'GET'), record['url'],
+                    weight=record.get('weight', 1),
+                    auth=record.get('auth', True),
+                    body=body, name=record.get('name'),
+                ))
+    return entries
+
+
+class Variables:
+    """Значения {{переменных}} из базы, выбор детерминирован seed."""
+
+    def __init__(self, rng, constants=None):
+        self.rng = rng
+        self.constants = constants or {}
+        self.samples = {
+            'userid': self.recent(User.objects.values_list('pk', flat=True)),
+            'recipeid': self.recent(
+                Recipe.objects.values_list('pk', flat=True)
+            ),
+            'tagid': self.recent(Tag.objects.values_list('pk', flat=True)),
+            'tagslug': self.recent(
+                Tag.objects.values_list('slug', flat=True)
+            ),
+            'ingredientid': self.recent(
+                Ingredient.objects.values_list('pk', flat=True)
+            ),
+            'firstletter': sorted({
+                name[:1] for name in self.recent(
+                    Ingredient.objects.values_list('name', flat=True)
+                )
+            }),
+        }
+
+    @staticmethod
+    def recent(queryset):
+        return list(queryset.order_by('-pk')[:SAMPLE_SIZE])
+
+    def value(self, name):
+        key = name.lower().replace('indredient', 'ingredient').replace(
+            'latter', 'letter'
+        )
+        for suffix, values in self.samples.items():
+            if key.endswith(suffix):
+                return str(self.rng.choice(values)) if values else None
+        return self.constants.get(name)
+
+    def substitute(self, text, escape=False):
+        missing = []
+
+        def replace(match):
+            value = self.value(match[1])
+            if value is None:
+                missing.append(match[1])
+                return match[0]
+            return quote(value, safe='') if escape else value
+
+        text = VARIABLE.sub(replace, text)
+        if missing:
+            raise KeyError(', '.join(missing))
+        return text
+
+
+def endpoint(method, url):
+    """Метка эндпоинта: метод и имя маршрута."""
+
+    path = urlsplit(url).path
+    try:
+        return f'{method} {resolve(path).view_name}'
+    except Resolver404:
+        return f'{method} {path}'
+
+
+class LocalClient:
+    """Запросы тестовым клиентом Django в этом процессе."""
+
+    concurrency = 1
+
+    def __init__(self, token):
+        self.client = APIClient()
+        self.client.raise_request_exception = False
+        self.token = token
+
+    def __call__(self, entry, url, body):
+        headers = {}
+        if entry.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.generic(
+                entry.method, url, body or '',
+                content_type='application/json', **headers
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(queries)
+
+
+class RemoteClient:
+    """Запросы к запущенному серверу, например gunicorn."""
+
+    def __init__(self, base_url, token, concurrency):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.concurrency = concurrency
+
+    def __call__(self, entry, url, body):
+        request = urllib.request.Request(
+            self.base_url + url, method=entry.method,
+            data=body.encode() if body else None,
+            headers={'Content-Type': 'application/json'},
+        )
+        if entry.auth:
+            request.add_header('Authorization', f'Token {self.token}')
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            status = error.code
+        return status, time.perf_counter() - started, None
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(samples, concurrency, elapsed=None):
+    latencies = sorted(sample[1] * 1000 for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    statuses = defaultdict(int)
+    for sample in samples:
+        statuses[str(sample[0])] += 1
+    errors = sum(1 for sample in samples if sample[0] >= 500)
+    busy = elapsed or sum(latencies) / 1000 / concurrency
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4),
+        'statuses': dict(statuses),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'rps': round(len(samples) / busy, 1) if busy else None,
+        'queries_mean': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run(client, entries, variables, requests, warmup, rng):
+    """Прогон взвешенной смеси запросов, возвращает отчёт по эндпоинтам."""
+
+    def prepare(entry):
+        try:
+            url = variables.substitute(entry.url, escape=True)
+            body = variables.substitute(entry.body) if entry.body else None
+        except KeyError as error:
+            raise KeyError(f'{entry.name}: нет значения для {error}')
+        return entry, url, body
+
+    weights = [entry.weight for entry in entries]
+    if warmup:
+        for entry in entries + rng.choices(entries, weights, k=warmup):
+            client(*prepare(entry))
+    prepared = [
+        prepare(entry)
+        for entry in rng.choices(entries, weights=weights, k=requests)
+    ]
+    started = time.perf_counter()
+    if client.concurrency > 1:
+        with ThreadPoolExecutor(client.concurrency) as pool:
+            results = list(pool.map(lambda args: client(*args), prepared))
+    else:
+        results = [client(*args) for args in prepared]
+    elapsed = time.perf_counter() - started
+    by_endpoint = defaultdict(list)
+    by_entry = defaultdict(list)
+    for (entry, url, _), result in zip(prepared, results):
+        by_endpoint[endpoint(entry.method, url)].append(result)
+        by_entry[entry.name].append(result)
+    return {
+        'total': summarize(results, client.concurrency, elapsed),
+        'endpoints': {
+            label: summarize(samples, client.concurrency)
+            for label, samples in sorted(by_endpoint.items())
+        },
+        'requests': {
+            name: summarize(samples, client.concurrency)
+            for name, samples in sorted(by_entry.items())
+        },
+    }
+
+
+def check_budget(report, budget):
+    """Список нарушений бюджета; правила '*' действуют для всех."""
+
+    limits = {
+        'p50_ms': max, 'p95_ms': max, 'p99_ms': max,
+        'queries': max, 'error_rate': max, 'rps': min,
+    }
+    failures = []
+    for label, stats in report['endpoints'].items():
+        rules = {**budget.get('*', {}), **budget.get(label, {})}
+        for name, limit in rules.items():
+            value = stats['queries_max' if name == 'queries' else name]
+            if value is None:
+                continue
+            if limits[name] is max and value > limit:
+                failures.append(f'{label}: {name} {value} > {limit}')
+            elif limits[name] is min and value < limit:
+                failures.append(f'{label}: {name} {value} < {limit}')
+    return failures
@@ -0,0 +1,17 @@
+"""Проверки настроек, выполняются manage.py check и перед запуском."""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def jwt_cache_check(app_configs, **kwargs):
+    """Отозванные JWT хранятся в кэше, он должен быть общим."""
+
+    if settings.JWT_AUTH and not settings.SHARED_CACHE:
+        return [Error(
+            'JWT_AUTH требует общего кэша (CACHE_BACKEND redis или file).',
+            hint=('С locmem отзыв refresh-токена при ротации и выходе '
+                  'виден только процессу, который его выполнил.'),
+            id='api.E001',
+        )]
+    return []
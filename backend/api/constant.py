@@ -14,3 +14,76 @@ MAX_LEN_NAME = 150
 MAX_LEN_PASSWORD = 150
 # Длина поля цвет
 LEN_COLOR = 7
+# Размер PDF в памяти, после которого он пишется во временный файл
+PDF_SPOOL_SIZE = 1024 * 1024
+# Время хранения готового списка покупок в кэше, секунды
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+# Максимальный размер PDF, который кладётся в кэш
+SHOPPING_CART_CACHE_MAX_SIZE = 512 * 1024
+# Время хранения ответов справочников (теги, ингредиенты), секунды
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+# Максимальное количество подсказок при поиске ингредиента
+INGREDIENT_SEARCH_LIMIT = 50
+# Размер таблицы, начиная с которого count берётся из статистики PostgreSQL
+ESTIMATE_COUNT_THRESHOLD = 100000
+# Время хранения избранного, корзины и подписок пользователя в кэше, секунды
+RELATIONS_CACHE_TIMEOUT = 60 * 60
+# Максимальная ширина вариантов картинки рецепта
+IMAGE_VARIANTS = {
+    'thumbnail': 240,
+    'card': 640,
+    'full': 1920,
+}
+# Качество сжатия картинок
+IMAGE_QUALITY = {
+    'webp': 80,
+    'jpeg': 85,
+}
+# Максимальный размер картинки рецепта, байты
+MAX_IMAGE_SIZE = 20 * 1024 * 1024
+# Размер картинки в памяти при разборе запроса, дальше - временный файл
+IMAGE_SPOOL_SIZE = 1024 * 1024
+# Время хранения пользователя по токену в общем кэше, секунды
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5
+# Время хранения и размер LRU токенов в памяти процесса
+AUTH_TOKEN_LOCAL_TTL = 10
+AUTH_TOKEN_LOCAL_SIZE = 1024
+# Максимальное количество id в одном пакетном запросе связей
+RELATIONS_BATCH_SIZE = 100
+# Подписчиков у автора, начиная с которого его рецепты не раскладываются
+# по лентам подписчиков, а читаются при показе ленты
+FEED_FANOUT_LIMIT = 10000
+# Сколько последних рецептов автора добавляется в ленту при подписке
+FEED_BACKFILL_LIMIT = 50
+# Вес добавления в избранное и в корзину в рейтинге рецептов
+RANKING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping': 0.5,
+}
+# Период полураспада рейтингов, секунды
+RANKING_HALF_LIFE = {
+    'popular': 60 * 60 * 24 * 30,
+    'trending': 60 * 60 * 24 * 2,
+}
+# Показатель степени двойки, после которого рейтинги приводятся
+# к новому началу отсчёта, чтобы не переполнить float
+RANKING_MAX_EXPONENT = 500
+# Сколько строк очереди активности учитывается в рейтингах за раз
+RANKING_BATCH_SIZE = 5000
+# Сколько похожих рецептов хранится для каждого рецепта
+SIMILAR_RECIPES_TOP_K = 20
+# Сколько похожих рецептов и рецептов из корзины отдаётся по умолчанию
+SIMILAR_RECIPES_LIMIT = 6
+# Сколько рецептов обрабатывается за раз при расчёте похожих
+SIMILAR_RECIPES_BATCH_SIZE = 500
+# Ингредиенты, которые есть в большем числе рецептов (соль, вода),
+# не дают кандидатов в похожие
+SIMILAR_RECIPES_MAX_FREQUENCY = 2000
+# Для скольких лучших по редким ингредиентам кандидатов близость
+# считается по всем ингредиентам
+SIMILAR_RECIPES_CANDIDATES = 100
+# Сколько произведений строк (оценка по частотам ингредиентов)
+# допускается в одной пачке расчёта похожих
+SIMILAR_RECIPES_BLOCK_SIZE = 2_000_000
+# Сколько раз повторять пересчёт похожих, если база занята
+SIMILAR_RECIPES_RETRIES = 3
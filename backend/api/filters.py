@@ -1,25 +1,42 @@
+from django.db.models import Exists, OuterRef, Value
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
+from api.constant import INGREDIENT_SEARCH_LIMIT
+from api.search import ingredient_index
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 
-class IngredientSearchFilter(SearchFilter):
-    """Фильтр ингредиентов."""
+class IngredientSearchFilter(BaseFilterBackend):
+    """Фильтр ингредиентов по индексу в памяти."""
 
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name or view.action != 'list':
+            return queryset
+        return ingredient_index.search(name, INGREDIENT_SEARCH_LIMIT)
+
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'), ('trending', 'В тренде')),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
@@ -28,8 +45,19 @@ class RecipeFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
+            'ordering',
         )
 
+    def get_tags(self, queryset, name, value):
+        """EXISTS вместо JOIN с DISTINCT: порядок по индексу pub_date."""
+
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
             return queryset.filter(favorite__user=self.request.user)
@@ -39,3 +67,19 @@ class RecipeFilter(FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(shopping__user=self.request.user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
+
+    def get_ordering(self, queryset, name, value):
+        """Порядок по рейтингу из RecipeScore (update_scores).
+
+        Рецепты, которых ещё нет в RecipeScore (новые, или
+        update_scores ещё не запускалась), идут с нулевым рейтингом.
+        """
+
+        return queryset.annotate(
+            rank=Coalesce(f'score__{value}', Value(0.0))
+        ).order_by('-rank', '-id')
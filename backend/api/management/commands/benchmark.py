@@ -0,0 +1,162 @@
+import json
+import os
+import random
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.benchmark import (LocalClient, RemoteClient, Variables,
+                           check_budget, mix_entries, postman_entries, run)
+from users.models import User
+
+DEFAULT_SOURCES = (
+    os.path.join(settings.CSV_FILES_DIR, 'benchmark_mix.jsonl'),
+    os.path.join(
+        settings.BASE_DIR.parent, 'postman-collection',
+        'diploma.postman_collection.json',
+    ),
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замер задержек, пропускной способности и количества '
+            'SQL-запросов API на смеси запросов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*', default=DEFAULT_SOURCES,
+            help='Коллекции Postman (*.json) и смеси запросов (*.jsonl).'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--warmup', type=int, default=50,
+            help=('Случайных запросов до начала замера, перед ними '
+                  'каждый запрос смеси выполняется один раз.')
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--user', help='Email пользователя для запросов с авторизацией.'
+        )
+        parser.add_argument(
+            '--writes', action='store_true',
+            help='Выполнять и изменяющие запросы (меняют базу).'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера вместо тестового клиента.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Параллельных запросов при --base-url.'
+        )
+        parser.add_argument('--output', help='Куда сохранить отчёт JSON.')
+        parser.add_argument(
+            '--budget',
+            default=os.path.join(
+                settings.CSV_FILES_DIR, 'benchmark_budget.json'
+            ),
+            help='Бюджет: {"<метод> <маршрут>" или "*": {p95_ms: ...}}.'
+        )
+        parser.add_argument(
+            '--compare', help='Прошлый отчёт для сравнения p95 и запросов.'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        entries, constants = [], {}
+        for source in options['sources']:
+            if source.endswith('.jsonl'):
+                entries += mix_entries(source)
+            else:
+                collection, variables = postman_entries(source)
+                entries += collection
+                constants.update(variables)
+        if not options['writes']:
+            entries = [entry for entry in entries if entry.safe]
+        if not entries:
+            raise CommandError('Нет запросов для прогона')
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет пользователя для авторизации')
+        token, _ = Token.objects.get_or_create(user=user)
+        if options['base_url']:
+            client = RemoteClient(
+                options['base_url'], token.key, options['concurrency']
+            )
+        else:
+            client = LocalClient(token.key)
+        try:
+            report = run(
+                client, entries, Variables(rng, constants),
+                options['requests'], options['warmup'], rng,
+            )
+        except KeyError as error:
+            raise CommandError(error.args[0])
+        report.update(
+            commit=git_commit(),
+            started=timezone.now().isoformat(),
+            database=connection.vendor,
+            mode='remote' if options['base_url'] else 'local',
+            concurrency=client.concurrency,
+            user=user.email,
+        )
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self.print_comparison(json.load(file), report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        failures = []
+        if os.path.exists(options['budget']):
+            with open(options['budget'], encoding='utf-8') as file:
+                failures = check_budget(report, json.load(file))
+        for failure in failures:
+            self.stderr.write(failure)
+        if failures:
+            raise CommandError(
+                f'Превышен бюджет производительности: {len(failures)}'
+            )
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"эндпоинт":<45} {"n":>5} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"rps":>7} {"sql":>5}'
+        )
+        rows = list(report['endpoints'].items()) + [('Итого', report['total'])]
+        for label, stats in rows:
+            self.stdout.write(
+                f'{label:<45} {stats["count"]:>5} {stats["p50_ms"]:>8} '
+                f'{stats["p95_ms"]:>8} {stats["p99_ms"]:>8} '
+                f'{stats["rps"]:>7} {stats["queries_max"]!s:>5}'
+            )
+
+    def print_comparison(self, previous, report):
+        self.stdout.write(
+            f'Сравнение с {previous.get("commit")}: p95 мс и запросов SQL'
+        )
+        for label, stats in report['endpoints'].items():
+            old = previous['endpoints'].get(label)
+            if old:
+                self.stdout.write(
+                    f'{label:<45} {old["p95_ms"]:>8} -> {stats["p95_ms"]:<8} '
+                    f'{old["queries_max"]!s:>4} -> {stats["queries_max"]!s}'
+                )
@@ -0,0 +1,126 @@
+"""Метрики запросов в формате Prometheus.
+
+Значения хранятся в памяти процесса: при нескольких воркерах
+gunicorn каждый отдаёт свои, Prometheus суммирует их по instance.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+# Границы корзин гистограммы длительности запроса, секунды.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Границы корзин гистограммы количества SQL-запросов.
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Registry:
+    """Счётчики и гистограммы по (view, method).
+
+    Количество и длительность - по всем запросам, SQL, части
+    времени и размер ответа - только по попавшим в выборку.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.totals = defaultdict(float)
+
+    def observe(self, view, method, status, duration, sample=None):
+        key = (view, method)
+        with self.lock:
+            self.requests[key + (status,)] += 1
+            self.durations[key].observe(duration)
+            if sample is not None:
+                self.queries[key].observe(sample['db_queries'])
+                for name in ('db', 'app', 'render'):
+                    self.totals[key + (name,)] += sample[f'{name}_ms'] / 1000
+                self.totals[key + ('bytes',)] += sample['bytes'] or 0
+
+    def render(self):
+        lines = [
+            '# TYPE foodgram_requests_total counter',
+            '# TYPE foodgram_request_duration_seconds histogram',
+            '# TYPE foodgram_db_queries histogram',
+            '# TYPE foodgram_request_part_seconds_total counter',
+            '# TYPE foodgram_response_bytes_total counter',
+        ]
+        with self.lock:
+            for (view, method, status), count in sorted(
+                self.requests.items()
+            ):
+                lines.append(
+                    f'foodgram_requests_total{{view="{view}",'
+                    f'method="{method}",status="{status}"}} {count}'
+                )
+            for (view, method), histogram in sorted(self.durations.items()):
+                lines.extend(histogram.lines(
+                    'foodgram_request_duration_seconds',
+                    f'view="{view}",method="{method}"',
+                ))
+            for (view, method), histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines(
+                    'foodgram_db_queries', f'view="{view}",method="{method}"'
+                ))
+            for (view, method, name), value in sorted(self.totals.items()):
+                labels = f'view="{view}",method="{method}"'
+                if name == 'bytes':
+                    lines.append(
+                        f'foodgram_response_bytes_total{{{labels}}} '
+                        f'{value:.0f}'
+                    )
+                else:
+                    lines.append(
+                        f'foodgram_request_part_seconds_total'
+                        f'{{{labels},part="{name}"}} {value:.6f}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    """/metrics для Prometheus, по токену METRICS_TOKEN.
+
+    Без токена /metrics открыт только при DEBUG, иначе его нет.
+    """
+
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,130 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.metrics import registry
+from api.nplusone import detect_nplusone
+
+logger = logging.getLogger('api.performance')
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: количество и время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class PerformanceMiddleware:
+    """Время запроса, SQL, view и рендеринга для каждого запроса.
+
+    Длительность и статус попадают в /metrics всегда. Доля
+    PERFORMANCE_SAMPLE_RATE запросов измеряется подробно: SQL
+    считается через execute_wrapper, в ответ добавляется
+    заголовок Server-Timing, в лог api.performance - строка JSON.
+    Сериализация DRF выполняется внутри view, поэтому её время
+    входит в app (время view без SQL).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        sampled = random.random() < settings.PERFORMANCE_SAMPLE_RATE
+        if sampled:
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        sample = None
+        if sampled:
+            sample = self.measure(request, response, timer, started, duration)
+            response['Server-Timing'] = ', '.join(
+                [f'db;dur={sample["db_ms"]};desc="{timer.count} queries"']
+                + [
+                    f'{name};dur={sample[name + "_ms"]}'
+                    for name in ('app', 'render', 'total')
+                ]
+            )
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': view,
+                'status': response.status_code,
+                **sample,
+            }))
+        registry.observe(
+            view, request.method, response.status_code, duration, sample
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request._view_finished = time.perf_counter()
+        return response
+
+    @staticmethod
+    def measure(request, response, timer, started, duration):
+        view_started = getattr(request, '_view_started', started)
+        view_finished = getattr(
+            request, '_view_finished', started + duration
+        )
+        finished = started + duration
+        if response.streaming:
+            size = response.get('Content-Length')
+            size = int(size) if size else None
+        else:
+            size = len(response.content)
+        return {
+            'db_queries': timer.count,
+            'db_ms': round(timer.duration * 1000, 2),
+            'app_ms': round(max(
+                0, (view_finished - view_started - timer.duration) * 1000
+            ), 2),
+            'render_ms': round((finished - view_finished) * 1000, 2),
+            'total_ms': round(duration * 1000, 2),
+            'bytes': size,
+        }
+
+
+class NPlusOneMiddleware:
+    """Поиск N+1 в запросах к API.
+
+    NPLUSONE_MODE: off - выключено, warn - предупреждение в лог
+    api.nplusone с местом вызова (staging), raise - исключение
+    (тесты).
+    """
+
+    def __init__(self, get_response):
+        if settings.NPLUSONE_MODE == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+        with detect_nplusone(
+            f'{request.method} {request.path}', mode=settings.NPLUSONE_MODE
+        ):
+            return self.get_response(request)
@@ -1,6 +1,14 @@
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
 
+from .constant import REFERENCE_CACHE_TIMEOUT
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .utils import reference_version
 
 
 class ListViewSet(mixins.CreateModelMixin,
@@ -8,3 +16,45 @@ class ListViewSet(mixins.CreateModelMixin,
                   mixins.RetrieveModelMixin,
                   viewsets.GenericViewSet):
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
+
+
+class CachedReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    """Справочник, ответы которого кэшируются до изменения модели.
+
+    Поддерживает ETag и Last-Modified: клиент с актуальной копией
+    получает 304 после одного запроса версии справочника. ETag
+    строится по номеру версии, поэтому различает и изменения
+    в пределах одной секунды.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        reference = reference_version(self.queryset.model)
+        etag = quote_etag(f'{self.basename}-{reference.version}')
+        last_modified = int(reference.updated_at.timestamp())
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+        path = md5(request.get_full_path().encode()).hexdigest()
+        cache_key = (
+            f'reference_{self.basename}_{reference.version}_{path}'
+        )
+        data = cache.get(cache_key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(cache_key, response.data, REFERENCE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,102 @@
+"""Поиск N+1: одинаковых по форме SQL-запросов в одном запросе API.
+
+Форма запроса - SQL без значений: параметры, числа, строки
+и списки IN заменены на ?. Если форма повторилась больше порога
+раз, это почти всегда запрос на каждую строку списка.
+"""
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.nplusone')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+SPACES = re.compile(r'\s+')
+IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+# Сколько кадров своего кода показывать в месте вызова.
+ORIGIN_FRAMES = 5
+# Кадры самого детектора в месте вызова не нужны.
+OWN_FILES = (
+    __file__, os.path.join(os.path.dirname(__file__), 'middleware.py')
+)
+
+
+class NPlusOneError(AssertionError):
+    """Повторяющиеся запросы в режиме raise (тесты)."""
+
+
+def query_shape(sql):
+    shape = LITERALS.sub('?', sql)
+    shape = IN_LIST.sub('IN (...)', shape)
+    return SPACES.sub(' ', shape).strip()
+
+
+def origin():
+    """Последние кадры стека из кода проекта."""
+
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(base)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in OWN_FILES
+    ]
+    return ''.join(traceback.format_list(frames[-ORIGIN_FRAMES:]))
+
+
+class QueryShapes:
+    """execute_wrapper, считающий формы запросов."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(IGNORED):
+            shape = query_shape(sql)
+            self.counts[shape] += 1
+            if self.counts[shape] == self.threshold + 1:
+                self.origins[shape] = origin()
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        return [
+            (shape, count, self.origins[shape])
+            for shape, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+
+def report(label, repeated, mode):
+    messages = [
+        f'N+1 в {label}: {count} раз\n{shape}\n{where}'
+        for shape, count, where in repeated
+    ]
+    if mode == 'raise':
+        raise NPlusOneError('\n\n'.join(messages))
+    for message in messages:
+        logger.warning(message)
+
+
+@contextmanager
+def detect_nplusone(label='block', threshold=None, mode='raise'):
+    """Проверка блока кода, например в тесте:
+
+    with detect_nplusone('список рецептов'):
+        client.get('/api/recipes/')
+    """
+
+    shapes = QueryShapes(threshold or settings.NPLUSONE_THRESHOLD)
+    with connection.execute_wrapper(shapes):
+        yield shapes
+    repeated = shapes.repeated()
+    if repeated:
+        report(label, repeated, mode)
@@ -1,6 +1,226 @@
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.constant import ESTIMATE_COUNT_THRESHOLD
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) по большой таблице.
+
+    На PostgreSQL количество берётся из статистики планировщика,
+    если таблица больше порога. Условия запроса при этом не
+    учитываются: когда оценка уместна, решает пагинация
+    (CustomPagination.estimate_count).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                estimate = int(cursor.fetchone()[0])
+            if estimate > ESTIMATE_COUNT_THRESHOLD:
+                return estimate
+        return super().count
 
 
 class CustomPagination(PageNumberPagination):
+    """Пагинация page/limit.
+
+    Если estimate_count включён и в запросе нет параметров, кроме
+    estimate_params (то есть список не отфильтрован), количество
+    берётся из оценки EstimatedCountPaginator.
+    """
+
     page_size_query_param = "limit"
     page_size = 6
+    estimate_count = True
+    estimate_params = ('page', 'limit')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = (
+            EstimatedCountPaginator if self.use_estimate(request)
+            else Paginator
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def use_estimate(self, request):
+        return self.estimate_count and set(request.query_params) <= set(
+            self.estimate_params
+        )
+
+
+class KeysetPagination(CustomPagination):
+    """Постраничный вывод с режимом курсора.
+
+    Без параметра cursor работает как обычная пагинация page/limit.
+    С ним (пустой cursor - первая страница) выборка идёт по ключу
+    keyset без OFFSET и без подсчёта общего количества. Порядок
+    в этом режиме всегда задаётся keyset.
+    """
+
+    cursor_query_param = 'cursor'
+    keyset = ('-pub_date', '-id')
+    cursor_only = False
+    ordering_query_param = 'ordering'
+    # Ключи для других сортировок: значение ordering -> keyset.
+    keysets = {}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keysets.get(
+            request.query_params.get(self.ordering_query_param),
+            type(self).keyset,
+        )
+        self.cursor_mode = (
+            self.cursor_only
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, '')
+        )
+        ordering = [
+            self.reverse_field(field) if reverse else field
+            for field in self.keyset
+        ]
+        results = self.fetch(queryset, ordering, position, page_size + 1)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and (has_more or not reverse) and position is not None:
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': None,
+            'next': self.encode_cursor(self.next_position, False),
+            'previous': self.encode_cursor(self.previous_position, True),
+            'results': data,
+        })
+
+    def fetch(self, queryset, ordering, position, limit):
+        """limit строк после position в порядке ordering."""
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.keyset_filter(ordering, position)
+                )
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound('Некорректный курсор.')
+        return list(queryset[:limit])
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, position):
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): position[previous.lstrip('-')]
+                for previous in ordering[:index]
+            }
+            condition |= Q(**equal, **{f'{name}__{lookup}': position[name]})
+        return condition
+
+    def get_position(self, instance):
+        return {
+            field.lstrip('-'): getattr(instance, field.lstrip('-'))
+            for field in self.keyset
+        }
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position, reverse = data['p'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Некорректный курсор.')
+        if not isinstance(position, dict) or set(position) != {
+            field.lstrip('-') for field in self.keyset
+        }:
+            raise NotFound('Некорректный курсор.')
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        if position is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            {'p': position, 'r': int(reverse)},
+            default=lambda value: value.isoformat()
+        ).encode()).decode()
+        url = remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class RecipePagination(KeysetPagination):
+    """Рецепты: по дате или по рейтингу (ordering=popular|trending)."""
+
+    estimate_params = ('page', 'limit', 'ordering')
+
+    keysets = {
+        'popular': ('-rank', '-id'),
+        'trending': ('-rank', '-id'),
+    }
+
+
+class SubscriptionPagination(KeysetPagination):
+    """Подписки в порядке оформления, ключ - id подписки."""
+
+    keyset = ('follow_id',)
+    # Подписки одного пользователя - малая часть таблицы.
+    estimate_count = False
+
+
+class FeedPagination(KeysetPagination):
+    """Лента подписок: всегда по курсору, из нескольких источников.
+
+    paginate_queryset получает список querysets (feed_sources),
+    из каждого берётся не больше страницы, страницы сливаются.
+    """
+
+    keyset = ('-pub_date', '-recipe_id')
+    cursor_only = True
+
+    def fetch(self, querysets, ordering, position, limit):
+        rows = {}
+        for queryset in querysets:
+            for row in super().fetch(queryset, ordering, position, limit):
+                rows.setdefault(self.row_key(row), row)
+        keys = sorted(rows, reverse=ordering[0].startswith('-'))
+        return [rows[key] for key in keys[:limit]]
+
+    def row_key(self, row):
+        return tuple(getattr(row, field.lstrip('-')) for field in self.keyset)
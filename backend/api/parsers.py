@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+import re
+import tempfile
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+
+from api.constant import IMAGE_SPOOL_SIZE, MAX_IMAGE_SIZE
+
+STRUCTURE = re.compile(rb'["{}\[\]:,]')
+STRING = re.compile(rb'["\\]')
+MAX_HEADER = 100
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+class RecipeJSONParser(JSONParser):
+    """JSON-парсер, который не держит картинку рецепта в памяти.
+
+    Значение поля image верхнего уровня (data:image/...;base64,...)
+    декодируется по мере чтения тела запроса во временный файл,
+    остальные поля разбираются обычным json. Размер картинки
+    и остального документа проверяется по ходу чтения, а по
+    Content-Length - ещё до него.
+    """
+
+    field = b'image'
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context.get('request')
+        rest_limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if request is not None:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if length > MAX_IMAGE_SIZE * 4 // 3 + rest_limit:
+                raise RequestTooLarge()
+        scanner = ImageFieldScanner(self.field, rest_limit)
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+        return scanner.finish(parser_context.get('encoding'))
+
+
+class ImageFieldScanner:
+    """Разбор JSON по кускам с вырезанием поля-картинки."""
+
+    def __init__(self, field, rest_limit):
+        self.field = field
+        self.rest_limit = rest_limit
+        self.rest = bytearray()
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = b''
+        self.key = False
+        self.expect_value = False
+        self.capturing = False
+        self.header = None
+        self.carry = b''
+        self.encoded = b''
+        self.size = 0
+        self.image = None
+
+    def write_rest(self, data):
+        self.rest += data
+        if len(self.rest) > self.rest_limit:
+            raise RequestTooLarge()
+
+    def feed(self, chunk):
+        position = copy_from = 0
+        while position < len(chunk):
+            if self.capturing:
+                position = self.feed_image(chunk, position)
+                copy_from = position
+            elif self.in_string:
+                position = self.feed_string(chunk, position)
+            else:
+                match = STRUCTURE.search(chunk, position)
+                if match is None:
+                    break
+                position = match.end()
+                char = match.group()
+                if char == b'"' and self.expect_value:
+                    self.write_rest(chunk[copy_from:position - 1] + b'null')
+                    self.start_image()
+                    continue
+                self.structure(char)
+        if not self.capturing:
+            self.write_rest(chunk[copy_from:])
+
+    def structure(self, char):
+        if char == b'"':
+            self.in_string = True
+            self.string_start = b''
+            return
+        if char == b':' and self.key:
+            self.key = False
+            self.expect_value = True
+            return
+        self.key = self.expect_value = False
+        if char in b'{[':
+            self.depth += 1
+        elif char in b'}]':
+            self.depth -= 1
+
+    def feed_string(self, chunk, position):
+        if self.escape:
+            self.escape = False
+            return position + 1
+        match = STRING.search(chunk, position)
+        end = match.start() if match else len(chunk)
+        if self.depth == 1 and len(self.string_start) <= len(self.field):
+            self.string_start += chunk[position:end]
+        if match is None:
+            return len(chunk)
+        if match.group() == b'\\':
+            self.escape = True
+            self.string_start += b'\\'
+            return end + 1
+        self.in_string = False
+        self.key = self.depth == 1 and self.string_start == self.field
+        return end + 1
+
+    def start_image(self):
+        self.capturing = True
+        self.expect_value = False
+        self.header = b''
+        self.image = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+
+    def feed_image(self, chunk, position):
+        end = chunk.find(b'"', position)
+        data = self.carry + chunk[position:len(chunk) if end == -1 else end]
+        self.carry = b''
+        trailing = len(data) - len(data.rstrip(b'\\'))
+        if trailing % 2:
+            if end != -1:
+                raise ParseError('Картинка должна быть передана в base64.')
+            data, self.carry = data[:-1], b'\\'
+        data = data.replace(b'\\/', b'/').replace(
+            b'\\n', b''
+        ).replace(b'\\r', b'')
+        if self.header is not None:
+            data = self.feed_header(data)
+        self.decode(data)
+        if end == -1:
+            return len(chunk)
+        if self.header is not None:
+            raise ParseError('Картинка должна быть передана в base64.')
+        self.decode(b'', final=True)
+        self.capturing = False
+        return end + 1
+
+    def feed_header(self, data):
+        self.header += data
+        comma = self.header.find(b',')
+        if comma == -1:
+            if len(self.header) > MAX_HEADER:
+                raise ParseError('Картинка должна быть передана в base64.')
+            return b''
+        header, data = self.header[:comma], self.header[comma + 1:]
+        if not (header.startswith(b'data:image/')
+                and header.endswith(b';base64')):
+            raise ParseError('Картинка должна быть передана в base64.')
+        self.header = None
+        return data
+
+    def decode(self, data, final=False):
+        self.encoded += data
+        usable = len(self.encoded) - len(self.encoded) % 4
+        if final and usable != len(self.encoded):
+            raise ParseError('Картинка должна быть передана в base64.')
+        if not usable:
+            return
+        try:
+            decoded = base64.b64decode(self.encoded[:usable], validate=True)
+        except (binascii.Error, ValueError):
+            raise ParseError('Картинка должна быть передана в base64.')
+        self.encoded = self.encoded[usable:]
+        self.size += len(decoded)
+        if self.size > MAX_IMAGE_SIZE:
+            raise RequestTooLarge(f'Картинка больше {MAX_IMAGE_SIZE} байт.')
+        self.image.write(decoded)
+
+    def finish(self, encoding):
+        if self.capturing or self.in_string:
+            raise ParseError('JSON parse error - неполный документ.')
+        try:
+            data = json.loads(self.rest.decode(encoding or 'utf-8'))
+        except ValueError as error:
+            raise ParseError(f'JSON parse error - {error}')
+        if self.image is not None and isinstance(data, dict):
+            self.image.seek(0)
+            data[self.field.decode()] = self.image
+        return data
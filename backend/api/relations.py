@@ -0,0 +1,243 @@
+"""Избранное, корзина и подписки пользователя в кэше.
+
+Для каждого пользователя и вида связи хранится отсортированный
+массив id (array('q') в байтах). Массив загружается из базы при
+первом обращении, а после коммита транзакции, изменившей связи,
+удаляется из кэша: правка на месте теряла бы одно из параллельных
+изменений и переживала бы откат транзакции. С locmem (кэш только
+своего процесса) массивы не кэшируются, SHARED_CACHE.
+
+add_relations и remove_relations меняют связи пачкой: одной
+вставкой и одним удалением с RETURNING (SQLite 3.35+), со
+счётчиками, кэшем и очередью рейтингов только для строк, которые
+изменил сам запрос.
+"""
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.constant import RANKING_WEIGHTS, RELATIONS_CACHE_TIMEOUT
+from api.utils import invalidate_shopping_carts
+from recipes.feed import follow_authors, unfollow_authors
+from recipes.models import FavoriteRecipe, Follow, Recipe, ShoppingCart
+from recipes.ranking import record_activity
+from recipes.signals import change_counter
+from users.models import User
+
+RELATIONS = {
+    'favorite': (FavoriteRecipe, 'user_id', 'recipe_id'),
+    'shopping': (ShoppingCart, 'user_id', 'recipe_id'),
+    'follow': (Follow, 'follower_id', 'author_id'),
+}
+
+
+def relation_key(kind, user_id):
+    return f'relations_{kind}_{user_id}'
+
+
+def unpack(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def load_relation_ids(kind, user_id):
+    """Отсортированные id связей пользователя, из кэша или из базы."""
+
+    model, owner, target = RELATIONS[kind]
+    if not settings.SHARED_CACHE:
+        return array('q', model.objects.filter(
+            **{owner: user_id}
+        ).order_by(target).values_list(target, flat=True))
+    data = cache.get(relation_key(kind, user_id))
+    if data is not None:
+        return unpack(data)
+    ids = array('q', model.objects.filter(
+        **{owner: user_id}
+    ).order_by(target).values_list(target, flat=True))
+    cache.set(
+        relation_key(kind, user_id), ids.tobytes(), RELATIONS_CACHE_TIMEOUT
+    )
+    return ids
+
+
+def forget_relations(kind, user_id):
+    """Удаляет закэшированные id после коммита текущей транзакции."""
+
+    transaction.on_commit(lambda: cache.delete(relation_key(kind, user_id)))
+
+
+def relations_changed(kind, user_id, target_ids, add):
+    """Что делают сигналы post_save и post_delete, сразу для пачки.
+
+    bulk_create и удаление без сигналов их не вызывают.
+    """
+
+    if not target_ids:
+        return
+    forget_relations(kind, user_id)
+    delta = 1 if add else -1
+    if kind == 'favorite':
+        change_counter(
+            Recipe.objects.filter(pk__in=target_ids), 'favorites_count',
+            delta
+        )
+    elif kind == 'follow':
+        change_counter(
+            User.objects.filter(pk__in=target_ids), 'followers_count', delta
+        )
+        if add:
+            follow_authors(user_id, target_ids)
+        else:
+            unfollow_authors(user_id, target_ids)
+    elif kind == 'shopping':
+        invalidate_shopping_carts([user_id])
+
+
+def unique(ids):
+    return list(dict.fromkeys(ids))
+
+
+def returned_rows(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def insert_relations(kind, user_id, target_ids, added_at):
+    """Вставляет связи, возвращает id тех, что вставлены этим запросом.
+
+    ON CONFLICT DO NOTHING ... RETURNING атомарен: связь, которую
+    параллельно вставил другой запрос, в ответ не попадёт и не будет
+    посчитана дважды.
+    """
+
+    if not target_ids:
+        return set()
+    model, owner, target = RELATIONS[kind]
+    quote = connection.ops.quote_name
+    columns = [owner, target]
+    extra = []
+    if kind in RANKING_WEIGHTS:
+        columns.append('added_at')
+        extra.append(added_at)
+    values = ', '.join(
+        [f'({", ".join(["%s"] * len(columns))})'] * len(target_ids)
+    )
+    params = []
+    for target_id in target_ids:
+        params.extend((user_id, target_id, *extra))
+    return {row[0] for row in returned_rows(
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({", ".join(map(quote, columns))}) VALUES {values} '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(target)}',
+        params,
+    )}
+
+
+def delete_relations(kind, user_id, target_ids):
+    """Удаляет связи одним DELETE ... RETURNING, без сигналов.
+
+    Возвращает {id: added_at} действительно удалённых связей
+    (None для подписок, у них нет даты добавления).
+    """
+
+    if not target_ids:
+        return {}
+    model, owner, target = RELATIONS[kind]
+    quote = connection.ops.quote_name
+    added_at = quote('added_at') if kind in RANKING_WEIGHTS else 'NULL'
+    return dict(returned_rows(
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(owner)} = %s AND {quote(target)} IN '
+        f'({", ".join(["%s"] * len(target_ids))}) '
+        f'RETURNING {quote(target)}, {added_at}',
+        [user_id, *target_ids],
+    ))
+
+
+@transaction.atomic
+def add_relations(kind, user_id, target_ids):
+    """Добавляет связи пачкой, возвращает {id: статус}.
+
+    Статусы: added, exists, not_found (нет такого рецепта или
+    автора), invalid (подписка на самого себя).
+    """
+
+    model, owner, target = RELATIONS[kind]
+    target_ids = unique(target_ids)
+    found = set(
+        model._meta.get_field(target).related_model.objects.filter(
+            pk__in=target_ids
+        ).values_list('pk', flat=True)
+    )
+    result = {}
+    for target_id in target_ids:
+        if target_id not in found:
+            result[target_id] = 'not_found'
+        elif kind == 'follow' and target_id == user_id:
+            result[target_id] = 'invalid'
+        else:
+            result[target_id] = None
+    added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    added = insert_relations(kind, user_id, [
+        target_id for target_id, status in result.items() if status is None
+    ], added_at)
+    relations_changed(kind, user_id, sorted(added), add=True)
+    if kind in RANKING_WEIGHTS:
+        record_activity(
+            kind, [(target_id, added_at) for target_id in added], 1
+        )
+    return {
+        target_id: status or ('added' if target_id in added else 'exists')
+        for target_id, status in result.items()
+    }
+
+
+@transaction.atomic
+def remove_relations(kind, user_id, target_ids):
+    """Удаляет связи одним DELETE ... IN, возвращает {id: статус}.
+
+    Статусы: deleted, absent (связи не было).
+    """
+
+    target_ids = unique(target_ids)
+    deleted = delete_relations(kind, user_id, target_ids)
+    relations_changed(kind, user_id, sorted(deleted), add=False)
+    if kind in RANKING_WEIGHTS:
+        record_activity(kind, deleted.items(), -1)
+    return {
+        target_id: 'deleted' if target_id in deleted else 'absent'
+        for target_id in target_ids
+    }
+
+
+class UserRelations:
+    """Связи текущего пользователя на время одного запроса."""
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded = {}
+
+    def has(self, kind, target_id):
+        if self.user is None or not self.user.is_authenticated:
+            return False
+        if kind not in self.loaded:
+            self.loaded[kind] = frozenset(
+                load_relation_ids(kind, self.user.id)
+            )
+        return target_id in self.loaded[kind]
+
+
+def get_relations(context):
+    """UserRelations, общий для всех сериализаторов запроса."""
+
+    if 'relations' not in context:
+        request = context.get('request')
+        context['relations'] = UserRelations(
+            request.user if request else None
+        )
+    return context['relations']
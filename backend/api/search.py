@@ -0,0 +1,63 @@
+import threading
+from bisect import bisect_left
+
+from api.utils import reference_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Названия хранятся отсортированными в нижнем регистре, поиск
+    по началу слова идёт бинарным поиском. Индекс перестраивается,
+    когда меняется версия справочника ингредиентов в базе,
+    поэтому изменения в одном процессе видны всем остальным.
+    Ключи и ингредиенты заменяются одним присваиванием кортежа,
+    поэтому поиск без блокировки не смешивает старый и новый индекс.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [])
+        self.lock = threading.Lock()
+
+    def build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.pk)
+        )
+        self.entries = (
+            [ingredient.name.lower() for ingredient in ingredients],
+            ingredients,
+        )
+        self.version = version
+
+    def refresh(self):
+        version = reference_version(Ingredient).version
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build(version)
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу, затем по вхождению."""
+
+        self.refresh()
+        keys, ingredients = self.entries
+        query = query.lower()
+        found = []
+        index = bisect_left(keys, query)
+        while (index < len(keys) and len(found) < limit
+               and keys[index].startswith(query)):
+            found.append(ingredients[index])
+            index += 1
+        if len(found) < limit:
+            for key, ingredient in zip(keys, ingredients):
+                if query in key and not key.startswith(query):
+                    found.append(ingredient)
+                    if len(found) == limit:
+                        break
+        return found
+
+
+ingredient_index = IngredientIndex()
@@ -1,13 +1,28 @@
 from django.contrib.auth import authenticate
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
 from rest_framework import serializers
 from rest_framework.exceptions import ParseError
 from rest_framework.validators import UniqueTogetherValidator
-
-from api.constant import MAX_AMOUNT, MIN_AMOUNT
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.authentication import is_revoked, revoke_token
+from api.constant import (MAX_AMOUNT, MAX_IMAGE_SIZE, MIN_AMOUNT,
+                          RELATIONS_BATCH_SIZE)
+from api.relations import get_relations
+from api.tasks import run_in_background
+from api.utils import (get_recipes_limit, invalidate_recipe_carts,
+                       recipe_image_srcset, recipe_image_url)
+from recipes.images import (decode_base64_image, process_recipe_image,
+                            save_upload)
+from recipes.recommendations import update_similar
+from recipes.search import update_search_index
 from users.models import User
 
 
@@ -24,12 +39,9 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return (
-            self.context['request'].user.is_authenticated
-            and obj.author.filter(
-                follower=self.context['request'].user
-            ).exists()
-        )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_relations(self.context).has('follow', obj.id)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -77,6 +89,28 @@ class GetTokenSerializer(serializers.Serializer):
         return attrs
 
 
+class JWTRefreshSerializer(TokenRefreshSerializer):
+    """Обновление JWT: refresh одноразовый, отозванный не принимается."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise InvalidToken('Токен отозван')
+        data = super().validate(attrs)
+        revoke_token(refresh)
+        return data
+
+
+class JWTLogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(write_only=True)
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тегов."""
 
@@ -117,27 +151,37 @@ class RecipeListSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientsSerializer(many=True, source='ingredient')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_srcset',
+            'image_status', 'text', 'cooking_time'
+        )
+
+    def get_image(self, obj):
+        view = self.context.get('view')
+        card = view and view.action in (
+            'list', 'feed', 'similar', 'cook_from_cart'
         )
+        variant = 'card' if card else 'full'
+        return recipe_image_url(self.context.get('request'), obj, variant)
+
+    def get_image_srcset(self, obj):
+        return recipe_image_srcset(self.context.get('request'), obj)
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return (request and request.user.is_authenticated
-                and obj.favorite.filter(
-                    user=request.user
-                ).exists())
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_relations(self.context).has('favorite', obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        return (request and request.user.is_authenticated
-                and obj.shopping.filter(
-                    user=request.user
-                ).exists())
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_relations(self.context).has('shopping', obj.id)
 
 
 class CreateIngredientSerializer(serializers.ModelSerializer):
@@ -155,18 +199,39 @@ class CreateIngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ('id', 'amount')
 
-    def validate_id(self, value):
-        if not Ingredient.objects.filter(id=value).exists():
-            raise ParseError('Фантастический ингредиент.')
-        return value
+
+class RecipeImageField(serializers.Field):
+    """Картинка в base64.
+
+    Принимает строку data:image/...;base64,... или файл, в который
+    её уже декодировал RecipeJSONParser. Возвращает файл.
+    """
+
+    def to_internal_value(self, data):
+        if hasattr(data, 'read'):
+            return data
+        if (not isinstance(data, str) or not data.startswith('data:image/')
+                or ';base64,' not in data):
+            raise serializers.ValidationError(
+                'Картинка должна быть передана в base64.'
+            )
+        if len(data) * 3 // 4 > MAX_IMAGE_SIZE:
+            raise serializers.ValidationError(
+                f'Картинка больше {MAX_IMAGE_SIZE} байт.'
+            )
+        try:
+            return ContentFile(decode_base64_image(data))
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор создания рецепта."""
 
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = CreateIngredientSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     cooking_time = serializers.IntegerField(
         min_value=MIN_AMOUNT,
         max_value=MAX_AMOUNT,
@@ -201,6 +266,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Некорректное количество ингредиентов.'
             )
+        unknown_tags = set(tags) - set(
+            Tag.objects.filter(pk__in=tags).values_list('pk', flat=True)
+        )
+        if unknown_tags:
+            raise serializers.ValidationError({
+                'tags': f'Тегов {sorted(unknown_tags)} не существует.'
+            })
+        if len(ingredient_id) != Ingredient.objects.filter(
+            pk__in=ingredient_id
+        ).count():
+            raise ParseError('Фантастический ингредиент.')
         return data
 
     def create_ingredients(self, recipe, ingredients):
@@ -214,24 +290,94 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(create_ingredients)
 
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только отличающиеся строки рецепт-ингредиент.
+
+        Возвращает True, если состав рецепта изменился.
+        """
+
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        removed = [
+            row.pk for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, row in existing.items():
+            if ingredient_id in amounts and (
+                row.amount != amounts[ingredient_id]
+            ):
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        added = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            self.create_ingredients(recipe, added)
+        return bool(removed or changed or added)
+
+    def save_upload(self, validated_data):
+        """Сохраняет исходную картинку до ответа, обработка - после."""
+
+        image = validated_data.pop('image')
+        validated_data['image_status'] = Recipe.ImageStatus.PENDING
+        validated_data['image_upload'] = save_upload(image)
+        return image
+
+    def save_image(self, recipe, image):
+        upload = recipe.image_upload
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe.pk, upload, image)
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
+        image = self.save_upload(validated_data)
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data, author=user)
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
+        update_search_index([recipe.pk])
+        transaction.on_commit(
+            lambda: run_in_background(update_similar, [recipe.pk])
+        )
+        self.save_image(recipe, image)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
+        image = self.save_upload(validated_data)
         instance.tags.set(validated_data.pop('tags'))
-        instance.ingredients.clear()
-        ingredients = validated_data.pop('ingredients')
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        if self.update_ingredients(
+            instance, validated_data.pop('ingredients')
+        ):
+            transaction.on_commit(lambda: invalidate_recipe_carts(instance))
+            transaction.on_commit(
+                lambda: run_in_background(update_similar, [instance.pk])
+            )
+        instance = super().update(instance, validated_data)
+        update_search_index([instance.pk])
+        self.save_image(instance, image)
+        return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
         return RecipeListSerializer(
             instance,
             context={
@@ -270,18 +416,27 @@ class FollowSerializer(serializers.ModelSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Список рецептов в подписке."""
 
+    image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+    def get_image(self, obj):
+        return recipe_image_url(
+            self.context.get('request'), obj, 'thumbnail'
+        )
+
+    def get_image_srcset(self, obj):
+        return recipe_image_srcset(self.context.get('request'), obj)
 
 
 class FollowShowSerializer(CustomUserSerializer):
     """Сериализатор списка подписок."""
 
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -292,21 +447,19 @@ class FollowShowSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, object):
-        request = self.context.get('request')
-        author_recipes = Recipe.objects.filter(author=object)
-        limit = request.query_params.get('recipes_limit')
-        print(limit)
-        if limit and limit.isdigit():
-            author_recipes = author_recipes[:int(limit)]
+        if hasattr(object, 'subscription_recipes'):
+            author_recipes = object.subscription_recipes
+        else:
+            author_recipes = Recipe.objects.filter(author=object)
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                author_recipes = author_recipes[:limit]
         return ShortRecipeSerializer(
             author_recipes,
             many=True,
             context=self.context
         ).data
 
-    def get_recipes_count(self, object):
-        return object.recipes.count()
-
 
 class ShoppingCartCreateDeleteSerializer(serializers.ModelSerializer):
     """Общий сериалайзер для избранного и корзины."""
@@ -334,3 +487,13 @@ class FavoriteCreateDeleteSerializer(ShoppingCartCreateDeleteSerializer):
 
     class Meta(ShoppingCartCreateDeleteSerializer.Meta):
         model = FavoriteRecipe
+
+
+class RelationsBatchSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетных связей."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RELATIONS_BATCH_SIZE,
+    )
@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import (forget_tokens, forget_user,
+                                revoke_user_tokens)
+from api.relations import RELATIONS, forget_relations
+from api.utils import invalidate_shopping_carts, touch_reference
+from recipes.models import (FavoriteRecipe, Follow, Ingredient,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    invalidate_shopping_carts([instance.user_id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate_shopping_carts(ShoppingCart.objects.filter(
+        recipe_id=instance.recipe_id
+    ).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_shopping_carts(ShoppingCart.objects.filter(
+            recipe__ingredient__ingredient=instance
+        ).values_list('user_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reference_changed(sender, **kwargs):
+    touch_reference(sender)
+
+
+def relation_args(sender, instance):
+    for kind, (model, owner, _) in RELATIONS.items():
+        if model is sender:
+            return kind, getattr(instance, owner)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def relation_created(sender, instance, created, **kwargs):
+    if created:
+        forget_relations(*relation_args(sender, instance))
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def relation_deleted(sender, instance, **kwargs):
+    forget_relations(*relation_args(sender, instance))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+def saves_auth(update_fields):
+    return update_fields is None or bool(
+        {'password', 'is_active'} & set(update_fields)
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    """Запоминает смену пароля или деактивацию для отзыва JWT.
+
+    Прежние значения берутся из снимка User.from_db, запрос к базе
+    нужен только пользователю, созданному не из выборки.
+    """
+
+    instance._revoke_tokens = False
+    if instance.pk is None or not saves_auth(update_fields):
+        return
+    stored = getattr(instance, '_stored_auth', None)
+    if stored is None:
+        stored = User.objects.filter(pk=instance.pk).values_list(
+            'password', 'is_active'
+        ).first()
+        if stored is None:
+            return
+    password, is_active = stored
+    instance._revoke_tokens = (
+        password != instance.password or is_active and not instance.is_active
+    )
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя."""
+
+    if not created:
+        forget_tokens(Token.objects.filter(user=instance).values_list(
+            'key', flat=True
+        ))
+        forget_user(instance.pk)
+        if getattr(instance, '_revoke_tokens', False):
+            revoke_user_tokens(instance.pk)
+    if saves_auth(update_fields):
+        instance.remember_auth()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
@@ -0,0 +1,133 @@
+"""Фоновое выполнение тяжёлой работы вне потока запроса.
+
+submit выполняет работу без обращения к базе (функция и аргументы
+должны пикаться для ProcessPoolRunner) в пуле потоков или
+процессов. run и callback после submit обращаются к базе и
+выполняются в отдельном пуле потоков родительского процесса, не
+в служебном потоке executor и не в потоке запроса. Очередь общая
+и ограничена TASK_QUEUE_SIZE: если все места заняты, работа
+выполняется сразу, в вызывающем потоке, - так перегрузка
+замедляет запросы, а не копит бесконечную очередь. InlineRunner
+выполняет всё сразу и нужен в тестах.
+
+Очередь живёт в памяти процесса и теряется, если он упадёт.
+Потерянную работу доделывают команды: rebuild_feed,
+rebuild_similar, process_recipe_images.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class InlineRunner:
+    """Выполняет работу сразу, в вызывающем потоке."""
+
+    shares_memory = True
+
+    def submit(self, func, *args, callback):
+        try:
+            result = func(*args)
+        except Exception as error:
+            callback(error=error)
+        else:
+            callback(result=result)
+
+    def run(self, func, *args):
+        """Выполняет func(*args), которой нужна база."""
+
+        func(*args)
+
+
+class PoolRunner(InlineRunner):
+    executor_class = None
+
+    def __init__(self):
+        self.executor = None
+        self.db_executor = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(settings.TASK_QUEUE_SIZE)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = self.executor_class(
+                    max_workers=settings.TASK_WORKERS
+                )
+            return self.executor
+
+    def get_db_executor(self):
+        with self.lock:
+            if self.db_executor is None:
+                self.db_executor = ThreadPoolExecutor(
+                    max_workers=settings.TASK_WORKERS,
+                    thread_name_prefix='tasks-db',
+                )
+            return self.db_executor
+
+    def submit(self, func, *args, callback):
+        if not self.slots.acquire(blocking=False):
+            return super().submit(func, *args, callback=callback)
+        future = self.get_executor().submit(func, *args)
+        future.add_done_callback(
+            lambda future: self.get_db_executor().submit(
+                self.done, future, callback
+            )
+        )
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            return super().run(func, *args)
+        self.get_db_executor().submit(self.execute, func, *args)
+
+    def done(self, future, callback):
+        error = future.exception()
+        if error is not None:
+            self.execute(callback, error=error)
+        else:
+            self.execute(callback, result=future.result())
+
+    def execute(self, func, *args, **kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception('Ошибка фоновой работы %r', func)
+        finally:
+            self.slots.release()
+            connections.close_all()
+
+
+class ThreadPoolRunner(PoolRunner):
+    executor_class = ThreadPoolExecutor
+
+
+class ProcessPoolRunner(PoolRunner):
+    executor_class = ProcessPoolExecutor
+    shares_memory = False
+
+
+_runner = None
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        _runner = import_string(settings.TASK_RUNNER)()
+    return _runner
+
+
+def run_in_background(func, *args):
+    """Выполняет func(*args) вне потока запроса, ошибки - в лог."""
+
+    def task():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Ошибка фоновой работы %s', func.__name__)
+
+    get_runner().run(task)
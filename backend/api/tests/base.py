@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from rest_framework.test import APIClient
+
+from users.models import User
+
+
+class APITestCase(TestCase):
+    """Пользователи с рецептами, подписками, избранным и корзиной."""
+
+    users_count = 4
+    recipes_per_author = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(5)
+        ]
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{i}@example.com', username=f'user{i}',
+                first_name='Имя', last_name='Фамилия', password='Pass12345!',
+            )
+            for i in range(cls.users_count)
+        ]
+        cls.user = cls.users[0]
+        cls.recipes = []
+        for number in range(cls.recipes_per_author * cls.users_count):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % cls.users_count],
+                name=f'Рецепт {number}', text='Описание', cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            recipe.tags.set(cls.tags[:number % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in cls.ingredients[:number % 4 + 2]
+            )
+            cls.recipes.append(recipe)
+        for author in cls.users[1:]:
+            Follow.objects.create(follower=cls.user, author=author)
+        for recipe in cls.recipes[::2]:
+            FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
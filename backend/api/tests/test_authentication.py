@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from api.authentication import (CachedTokenAuthentication, local_cache,
+                                token_cache_key)
+from api.tests.base import APITestCase
+from users.models import User
+
+
+class TokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        local_cache.items.clear()
+        self.addCleanup(local_cache.items.clear)
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.key)
+
+    def test_cached_after_first_request(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual((user, token), (self.user, self.token))
+
+    def test_default_cache_only_when_shared(self):
+        self.authenticate()
+        self.assertIsNone(cache.get(token_cache_key(self.key)))
+        local_cache.items.clear()
+        with override_settings(SHARED_CACHE=True):
+            self.authenticate()
+        self.assertEqual(
+            cache.get(token_cache_key(self.key)), self.token
+        )
+
+    def test_logout_forgets_token(self):
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivation_forgets_token(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+
+class UserSavingTests(APITestCase):
+
+    def save(self, user, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            user.save(**kwargs)
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "users_user"' in query['sql']
+        ]
+
+    def test_last_login_without_select(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(self.save(user, update_fields=['last_login']), [])
+        self.assertFalse(user._revoke_tokens)
+
+    def test_password_change_without_select(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('NewPass12345!')
+        self.assertEqual(self.save(user), [])
+        self.assertTrue(user._revoke_tokens)
+        self.assertEqual(self.save(user), [])
+        self.assertFalse(user._revoke_tokens)
+
+    def test_deactivation_revokes(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        self.save(user, update_fields=['is_active'])
+        self.assertTrue(user._revoke_tokens)
+        user.is_active = True
+        self.save(user)
+        self.assertFalse(user._revoke_tokens)
+
+    def test_unsaved_password_not_remembered(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('NewPass12345!')
+        self.save(user, update_fields=['last_login'])
+        self.save(user, update_fields=['password'])
+        self.assertTrue(user._revoke_tokens)
+
+    def test_instance_not_from_database(self):
+        user = User(pk=self.user.pk, email=self.user.email,
+                    username=self.user.username,
+                    password=self.user.password)
+        self.assertEqual(len(self.save(user)), 1)
+        self.assertFalse(user._revoke_tokens)
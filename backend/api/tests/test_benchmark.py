@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+from api.tests.base import APITestCase
+
+
+class BenchmarkBudgetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.mix = self.write(
+            'mix.jsonl', {'name': 'Теги', 'url': '/api/tags/'}
+        )
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(content, file, ensure_ascii=False)
+        return path
+
+    def benchmark(self, budget):
+        stderr = StringIO()
+        call_command(
+            'benchmark', self.mix, requests=5, warmup=0,
+            budget=self.write('budget.json', budget),
+            stdout=StringIO(), stderr=stderr,
+        )
+        return stderr.getvalue()
+
+    def test_within_budget(self):
+        self.assertEqual(self.benchmark({'*': {'queries': 10}}), '')
+
+    def test_regression_raises_command_error(self):
+        with self.assertRaisesMessage(CommandError, 'бюджет'):
+            self.benchmark({'GET tags-list': {'queries': 0}})
@@ -0,0 +1,76 @@
+from io import StringIO
+
+from django.core.management import call_command
+from recipes.models import Recipe
+
+from api.tests.base import APITestCase
+from users.models import User
+
+
+class CountersTests(APITestCase):
+
+    def favorites(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk).favorites_count
+
+    def followers(self, user):
+        return User.objects.get(pk=user.pk).followers_count
+
+    def test_favorite(self):
+        recipe = self.recipes[1]
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.client.post(url)
+        self.assertEqual(self.favorites(recipe), 1)
+        self.client.delete(url)
+        self.assertEqual(self.favorites(recipe), 0)
+
+    def test_cart_keeps_favorites(self):
+        recipe = self.recipes[1]
+        self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(self.favorites(recipe), 0)
+
+    def test_follow(self):
+        author = self.users[1]
+        self.client.force_authenticate(self.users[2])
+        url = f'/api/users/{author.pk}/subscribe/'
+        self.client.post(url)
+        self.assertEqual(self.followers(author), 2)
+        self.client.delete(url)
+        self.assertEqual(self.followers(author), 1)
+
+    def test_recipes(self):
+        author = self.users[1]
+        Recipe.objects.get(pk=self.recipes[1].pk).delete()
+        self.assertEqual(User.objects.get(pk=author.pk).recipes_count, 3)
+
+    def test_batch(self):
+        recipes = [self.recipes[1].pk, self.recipes[3].pk]
+        self.client.post('/api/recipes/favorite/', {'ids': recipes},
+                         format='json')
+        self.assertEqual(sorted(Recipe.objects.filter(
+            pk__in=recipes
+        ).values_list('favorites_count', flat=True)), [1, 1])
+        self.client.delete('/api/recipes/favorite/', {'ids': recipes},
+                           format='json')
+        self.assertEqual(sorted(Recipe.objects.filter(
+            pk__in=recipes
+        ).values_list('favorites_count', flat=True)), [0, 0])
+        self.client.delete('/api/users/subscribe/', {
+            'ids': [user.pk for user in self.users[1:]],
+        }, format='json')
+        self.assertFalse(User.objects.filter(followers_count__gt=0).exists())
+
+    def test_counters_never_negative(self):
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=0)
+        self.client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(self.favorites(recipe), 0)
+
+    def test_rebuild_repairs_drift(self):
+        Recipe.objects.update(favorites_count=42)
+        User.objects.update(recipes_count=0, followers_count=7)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.favorites(self.recipes[0]), 1)
+        self.assertEqual(self.favorites(self.recipes[1]), 0)
+        self.assertEqual(User.objects.get(pk=self.user.pk).recipes_count, 4)
+        self.assertEqual(self.followers(self.users[1]), 1)
+        self.assertEqual(self.followers(self.user), 0)
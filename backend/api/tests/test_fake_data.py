@@ -0,0 +1,106 @@
+import io
+import shutil
+import statistics
+import tempfile
+from collections import Counter
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from recipes.models import (FavoriteRecipe, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, SimilarRecipe, Tag)
+
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GenerateFakeDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(30)
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, seed=0, **options):
+        options = {
+            'users': 50, 'recipes': 300, 'seed': seed, 'skip_index': True,
+            'skip_feed': True, 'skip_scores': True, 'skip_similar': True,
+            **options,
+        }
+        call_command('generate_fake_data', stdout=io.StringIO(), **options)
+
+    def snapshot(self):
+        """Сгенерированные строки с id, отсчитанными от первых."""
+
+        first_user = User.objects.order_by('pk').first().pk
+        first_recipe = Recipe.objects.order_by('pk').first().pk
+        recipes = [
+            (author - first_user, name.split(' №')[0], text, cooking_time)
+            for author, name, text, cooking_time in Recipe.objects.order_by(
+                'pk'
+            ).values_list('author', 'name', 'text', 'cooking_time')
+        ]
+        ingredients = sorted(
+            (recipe - first_recipe, ingredient, amount)
+            for recipe, ingredient, amount in
+            RecipeIngredient.objects.values_list(
+                'recipe', 'ingredient', 'amount'
+            )
+        )
+        favorites = sorted(
+            (user - first_user, recipe - first_recipe)
+            for user, recipe in FavoriteRecipe.objects.values_list(
+                'user', 'recipe'
+            )
+        )
+        return recipes, ingredients, favorites
+
+    def clear(self):
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_same_seed_same_rows(self):
+        self.generate()
+        first = self.snapshot()
+        self.clear()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        self.generate(seed=1)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_skewed_distributions(self):
+        self.generate()
+        per_author = sorted(Counter(Recipe.objects.values_list(
+            'author', flat=True
+        )).values(), reverse=True)
+        self.assertGreater(
+            per_author[0], 5 * statistics.median(per_author)
+        )
+        favorites = sorted(Counter(FavoriteRecipe.objects.values_list(
+            'recipe', flat=True
+        )).values(), reverse=True)
+        top = favorites[:len(favorites) // 10]
+        self.assertGreater(sum(top), 0.3 * sum(favorites))
+
+    def test_derived_rebuilds_are_optional(self):
+        self.generate()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertFalse(SimilarRecipe.objects.exists())
+        self.clear()
+        self.generate(skip_feed=False, skip_similar=False)
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertTrue(SimilarRecipe.objects.exists())
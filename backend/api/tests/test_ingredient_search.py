@@ -0,0 +1,24 @@
+from recipes.models import Ingredient
+
+from api.tests.base import APITestCase
+from api.utils import touch_reference
+
+
+class IngredientSearchTests(APITestCase):
+
+    def names(self, query):
+        response = self.anonymous.get('/api/ingredients/', {'name': query})
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_matches_first(self):
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        Ingredient.objects.create(name='Ванильный сахар', measurement_unit='г')
+        self.assertEqual(self.names('сах'), ['Сахар', 'Ванильный сахар'])
+
+    def test_bulk_load_is_seen_after_version_bump(self):
+        self.names('ман')
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Манго', measurement_unit='шт')]
+        )
+        touch_reference(Ingredient)
+        self.assertEqual(self.names('ман'), ['Манго'])
@@ -0,0 +1,100 @@
+from django.core.checks import run_checks
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from api.authentication import CachedJWTAuthentication, local_cache
+from api.tests.base import APITestCase
+from api.views import JWTLogin, JWTLogout, JWTRefresh
+
+# Маршруты JWT подключаются в api.urls только при JWT_AUTH на импорте
+urlpatterns = [
+    path('api/auth/', include([
+        path('jwt/create/', JWTLogin.as_view()),
+        path('jwt/refresh/', JWTRefresh.as_view()),
+        path('jwt/logout/', JWTLogout.as_view(
+            authentication_classes=[CachedJWTAuthentication]
+        )),
+    ])),
+]
+
+
+@override_settings(
+    ROOT_URLCONF='api.tests.test_jwt', JWT_AUTH=True, SHARED_CACHE=True
+)
+class JWTTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        local_cache.items.clear()
+        self.addCleanup(local_cache.items.clear)
+        response = self.anonymous.post('/api/auth/jwt/create/', {
+            'email': self.user.email, 'password': 'Pass12345!',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.access = response.data['access']
+        self.refresh = response.data['refresh']
+
+    def refresh_tokens(self, refresh):
+        return self.anonymous.post(
+            '/api/auth/jwt/refresh/', {'refresh': refresh}
+        )
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+        return CachedJWTAuthentication().authenticate(request)
+
+    def test_access_authenticates(self):
+        user, _ = self.authenticate(self.access)
+        self.assertEqual(user, self.user)
+
+    def test_refresh_rotates(self):
+        response = self.refresh_tokens(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+        user, _ = self.authenticate(response.data['access'])
+        self.assertEqual(user, self.user)
+        self.assertEqual(
+            self.refresh_tokens(response.data['refresh']).status_code, 200
+        )
+
+    def test_rotated_refresh_rejected(self):
+        self.assertEqual(self.refresh_tokens(self.refresh).status_code, 200)
+        self.assertEqual(self.refresh_tokens(self.refresh).status_code, 401)
+
+    def test_logout_revokes_refresh_and_access(self):
+        response = self.anonymous.post(
+            '/api/auth/jwt/logout/', {'refresh': self.refresh},
+            HTTP_AUTHORIZATION=f'Bearer {self.access}',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.refresh_tokens(self.refresh).status_code, 401)
+        with self.assertRaises(InvalidToken):
+            self.authenticate(self.access)
+
+    def test_password_change_revokes_all(self):
+        self.user.set_password('NewPass12345!')
+        self.user.save()
+        self.assertEqual(self.refresh_tokens(self.refresh).status_code, 401)
+        with self.assertRaises(InvalidToken):
+            self.authenticate(self.access)
+
+
+class JWTCacheCheckTests(APITestCase):
+
+    def errors(self):
+        return [
+            message.id for message in run_checks()
+            if message.id == 'api.E001'
+        ]
+
+    @override_settings(JWT_AUTH=True, SHARED_CACHE=False)
+    def test_jwt_requires_shared_cache(self):
+        self.assertEqual(self.errors(), ['api.E001'])
+
+    @override_settings(JWT_AUTH=True, SHARED_CACHE=True)
+    def test_jwt_with_shared_cache(self):
+        self.assertEqual(self.errors(), [])
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from recipes.loaders import read_json
+from recipes.models import Ingredient, ReferenceVersion, Tag
+
+from api.constant import MAX_LEN_TITLE
+
+
+class LoadCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, command, path, *args):
+        output = io.StringIO()
+        call_command(command, path, *args, stdout=output)
+        return output.getvalue()
+
+    def test_rerun_is_idempotent(self):
+        path = self.write('ingredients.csv', 'соль,г\nсахар,г\nмука,кг\n')
+        self.assertIn('записано 3', self.load('load_ingredients', path))
+        self.assertIn('записано 0', self.load('load_ingredients', path))
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_skipped_rows(self):
+        path = self.write('ingredients.csv', (
+            'соль,г\n'
+            ',г\n'
+            'перец\n'
+            f'{"я" * (MAX_LEN_TITLE + 1)},г\n'
+            'соль,г\n'
+        ))
+        output = self.load('load_ingredients', path)
+        self.assertIn('прочитано 5, пропущено 3, записано 1', output)
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)), ['соль']
+        )
+
+    def test_json_array_and_lines(self):
+        records = [
+            {'name': f'ингредиент {number}', 'measurement_unit': 'г'}
+            for number in range(20)
+        ]
+        array = self.write('ingredients.json', json.dumps(
+            records, ensure_ascii=False
+        ))
+        lines = self.write('ingredients.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+        self.assertIn('записано 20', self.load('load_ingredients', array))
+        self.assertIn('записано 0', self.load('load_ingredients', lines))
+        self.assertEqual(Ingredient.objects.count(), 20)
+
+    def test_json_records_split_between_chunks(self):
+        records = [{'name': f'имя "{number}"'} for number in range(50)]
+        path = self.write('records.json', json.dumps(records))
+        with mock.patch('recipes.loaders.JSON_CHUNK', 7):
+            self.assertEqual(list(read_json(path)), records)
+
+    def test_invalid_json(self):
+        path = self.write('broken.json', '[{"name": "соль", ')
+        with self.assertRaises(CommandError):
+            self.load('load_ingredients', path)
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.load('load_ingredients', os.path.join(self.directory, 'x'))
+
+    def test_tags_update_on_conflict(self):
+        path = self.write('tags.csv', 'Завтрак,#82ac64,breakfast\n')
+        self.load('load_tags', path)
+        path = self.write('tags.csv', 'Утро,#000000,breakfast\n')
+        self.assertIn('записано 1', self.load('load_tags', path))
+        tag = Tag.objects.get()
+        self.assertEqual((tag.name, tag.color), ('Утро', '#000000'))
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write('ingredients.csv', 'соль,г\n')
+        self.load('load_ingredients', path, '--dry-run')
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_load_changes_reference_version(self):
+        path = self.write('ingredients.csv', 'соль,г\n')
+        self.load('load_ingredients', path)
+        self.assertEqual(
+            ReferenceVersion.objects.get(pk='recipes.ingredient').version, 1
+        )
@@ -0,0 +1,21 @@
+from django.test import SimpleTestCase, override_settings
+
+
+class MetricsAccessTests(SimpleTestCase):
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_hidden_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_in_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_requests_total', response.content)
@@ -0,0 +1,109 @@
+from django.test import RequestFactory, override_settings
+from recipes.models import Recipe
+
+from api.middleware import NPlusOneMiddleware
+from api.nplusone import NPlusOneError, detect_nplusone
+from api.tests.base import APITestCase
+
+
+@override_settings(NPLUSONE_MODE='raise', NPLUSONE_THRESHOLD=3)
+class NPlusOneDetectorTests(APITestCase):
+
+    def test_repeated_query_raises(self):
+        with self.assertRaises(NPlusOneError):
+            with detect_nplusone('цикл'):
+                for recipe in Recipe.objects.all():
+                    recipe.author.username
+
+    def test_middleware_raises_for_api_requests(self):
+        def view(request):
+            return [recipe.author.username for recipe in Recipe.objects.all()]
+
+        request = RequestFactory().get('/api/recipes/')
+        with self.assertRaises(NPlusOneError):
+            NPlusOneMiddleware(view)(request)
+
+    def test_middleware_skips_other_paths(self):
+        def view(request):
+            return [recipe.author.username for recipe in Recipe.objects.all()]
+
+        request = RequestFactory().get('/admin/')
+        self.assertEqual(len(NPlusOneMiddleware(view)(request)),
+                         len(self.recipes))
+
+
+@override_settings(NPLUSONE_MODE='raise', NPLUSONE_THRESHOLD=3)
+class NoNPlusOneTests(APITestCase):
+    """Основные маршруты API проходят через детектор в режиме raise."""
+
+    def assert_ok(self, response, status=200):
+        self.assertEqual(
+            response.status_code, status, getattr(response, 'data', None)
+        )
+
+    def test_recipe_routes(self):
+        recipe = self.recipes[0]
+        for url in (
+            '/api/recipes/?limit=10',
+            '/api/recipes/?limit=10&is_favorited=1',
+            '/api/recipes/?limit=10&is_in_shopping_cart=1',
+            f'/api/recipes/?limit=10&author={self.users[1].pk}',
+            '/api/recipes/?limit=10&tags=tag0&tags=tag1',
+            '/api/recipes/?limit=10&cursor=',
+            '/api/recipes/feed/?limit=10',
+            f'/api/recipes/{recipe.pk}/',
+            f'/api/recipes/{recipe.pk}/similar/',
+            '/api/recipes/cook_from_cart/',
+            '/api/recipes/download_shopping_cart/',
+        ):
+            with self.subTest(url=url):
+                self.assert_ok(self.client.get(url))
+        self.assert_ok(
+            self.client.post(f'/api/recipes/{self.recipes[1].pk}/favorite/'),
+            201,
+        )
+        self.assert_ok(
+            self.client.delete(f'/api/recipes/{recipe.pk}/shopping_cart/'),
+            204,
+        )
+        self.assert_ok(self.client.post(
+            '/api/recipes/favorite/',
+            {'ids': [item.pk for item in self.recipes]}, format='json',
+        ))
+
+    def test_user_routes(self):
+        for url in (
+            '/api/users/',
+            f'/api/users/{self.users[1].pk}/',
+            '/api/users/me/',
+            '/api/users/subscriptions/?recipes_limit=2',
+        ):
+            with self.subTest(url=url):
+                self.assert_ok(self.client.get(url))
+        self.assert_ok(self.client.delete(
+            '/api/users/subscribe/',
+            {'ids': [user.pk for user in self.users]}, format='json',
+        ))
+        self.assert_ok(self.client.post(
+            '/api/users/subscribe/',
+            {'ids': [user.pk for user in self.users[1:]]}, format='json',
+        ))
+
+    def test_djoser_routes(self):
+        self.assert_ok(self.anonymous.post('/api/users/', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': 'Pass12345!',
+        }, format='json'), 201)
+        response = self.anonymous.post('/api/auth/token/login/', {
+            'email': 'new@example.com', 'password': 'Pass12345!',
+        }, format='json')
+        self.assert_ok(response)
+        client = self.anonymous
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+        )
+        self.assert_ok(client.post('/api/users/set_password/', {
+            'current_password': 'Pass12345!', 'new_password': 'Pass54321!',
+        }, format='json'), 204)
+        self.assert_ok(client.post('/api/auth/token/logout/'), 204)
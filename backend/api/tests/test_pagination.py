@@ -0,0 +1,126 @@
+import base64
+import json
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes.models import Recipe
+
+from api.tests.base import APITestCase
+
+
+def cursor_of(url):
+    return parse_qs(urlparse(url).query)['cursor'][0]
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def walk(self, url, client=None):
+        """id всех страниц по ссылкам next и ответы по порядку."""
+
+        client = client or self.anonymous
+        pages = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertIsNone(response.data['count'])
+            pages.append(response.data)
+            url = response.data['next']
+        return [
+            [item['id'] for item in page['results']] for page in pages
+        ], pages
+
+    def expected_recipes(self):
+        return list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+
+    def test_recipes_next_pages(self):
+        ids, pages = self.walk('/api/recipes/?cursor=&limit=5')
+        self.assertEqual([len(page) for page in ids], [5, 5, 5, 1])
+        self.assertEqual(sum(ids, []), self.expected_recipes())
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_recipes_previous_page(self):
+        ids, pages = self.walk('/api/recipes/?cursor=&limit=5')
+        response = self.anonymous.get(pages[2]['previous'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], ids[1]
+        )
+        response = self.anonymous.get(response.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], ids[0]
+        )
+
+    def test_pub_date_ties(self):
+        Recipe.objects.update(pub_date=timezone.now())
+        ids, _ = self.walk('/api/recipes/?cursor=&limit=3')
+        self.assertEqual(sum(ids, []), self.expected_recipes())
+        self.assertEqual(len(set(sum(ids, []))), len(self.recipes))
+
+    def test_tampered_cursor(self):
+        _, pages = self.walk('/api/recipes/?cursor=&limit=5')
+        cursor = json.loads(base64.urlsafe_b64decode(
+            cursor_of(pages[0]['next'])
+        ))
+        broken = [
+            'not-base64!',
+            base64.urlsafe_b64encode(b'{"p": 1}').decode(),
+            base64.urlsafe_b64encode(json.dumps(
+                {'p': {'id': 1}, 'r': 0}
+            ).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps(
+                {'p': {**cursor['p'], 'pub_date': 'вчера'}, 'r': 0}
+            ).encode()).decode(),
+        ]
+        for value in broken:
+            with self.subTest(cursor=value):
+                response = self.anonymous.get(
+                    '/api/recipes/', {'cursor': value}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_subscriptions(self):
+        url = '/api/users/subscriptions/?cursor=&limit=1'
+        ids, pages = self.walk(url, self.client)
+        self.assertEqual(
+            sum(ids, []), [user.pk for user in self.users[1:]]
+        )
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], ids[-2]
+        )
+
+    def test_subscriptions_tampered_cursor(self):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'cursor': 'e30='}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'оценка есть только в PG')
+class EstimatedCountTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipes_recipe')
+        patcher = mock.patch('api.pagination.ESTIMATE_COUNT_THRESHOLD', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counts(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        return any('COUNT(' in query['sql'] for query in queries)
+
+    def test_recipe_list_estimated(self):
+        self.assertFalse(self.counts('/api/recipes/?limit=5'))
+
+    def test_filtered_list_counted(self):
+        self.assertTrue(self.counts(
+            f'/api/recipes/?author={self.users[1].pk}'
+        ))
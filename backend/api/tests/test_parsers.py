@@ -0,0 +1,130 @@
+import base64
+import io
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.test import APIRequestFactory
+
+from api.parsers import RecipeJSONParser, RequestTooLarge
+
+# Байты, в base64 которых есть и "/", и "+".
+IMAGE = bytes(range(256)) * 3
+ENCODED = base64.b64encode(IMAGE).decode()
+
+
+def parse(body, chunk_size=64 * 1024):
+    parser = RecipeJSONParser()
+    parser.chunk_size = chunk_size
+    return parser.parse(io.BytesIO(body))
+
+
+class RecipeJSONParserTests(SimpleTestCase):
+
+    def body(self, image=f'data:image/png;base64,{ENCODED}', **fields):
+        return json.dumps({'name': 'Суп', 'image': image, **fields},
+                          ensure_ascii=False).encode()
+
+    def assert_image(self, data, expected=IMAGE):
+        self.assertEqual(data['image'].read(), expected)
+
+    def test_every_chunk_boundary(self):
+        body = self.body(tags=[1, 2]).replace(b'/', b'\\/')
+        for size in range(1, 40):
+            with self.subTest(chunk_size=size):
+                data = parse(body, size)
+                self.assert_image(data)
+                self.assertEqual(data['name'], 'Суп')
+                self.assertEqual(data['tags'], [1, 2])
+
+    def test_escapes_split_between_chunks(self):
+        body = (
+            b'{"text": "a\\\\\\"b", "image": "data:image/png;base64,'
+            + ENCODED.replace('/', '\\/').encode()
+            + b'"}'
+        )
+        for size in (1, 2, 3, 5):
+            with self.subTest(chunk_size=size):
+                data = parse(body, size)
+                self.assertEqual(data['text'], 'a\\"b')
+                self.assert_image(data)
+
+    def test_nested_image_keys_are_kept(self):
+        body = json.dumps({
+            'ingredients': [{'image': 'data:image/png;base64,AAAA'}],
+            'meta': {'image': 'x'},
+            'name': 'image',
+        }).encode()
+        for size in (1, 4, 1024):
+            with self.subTest(chunk_size=size):
+                self.assertEqual(parse(body, size), json.loads(body))
+
+    def test_escaped_key_is_parsed_as_plain_json(self):
+        body = b'{"im\\u0061ge": "data:image/png;base64,AAAA"}'
+        self.assertEqual(parse(body, 3), json.loads(body))
+
+    def test_image_null(self):
+        self.assertEqual(parse(b'{"image": null, "a": 1}', 2),
+                         {'image': None, 'a': 1})
+
+    def test_malformed_data_uri(self):
+        bodies = [
+            self.body(image='image/png;base64,AAAA'),
+            self.body(image='data:text/plain;base64,AAAA'),
+            self.body(image='data:image/png,AAAA'),
+            self.body(image='data:image/png;base64,AAA'),
+            self.body(image='data:image/png;base64,A*AA'),
+            self.body(image='data:image/png;base64'),
+            self.body(image='x' * 200),
+        ]
+        for body in bodies:
+            with self.subTest(body=body[:60]):
+                with self.assertRaises(ParseError):
+                    parse(body, 7)
+
+    def test_incomplete_document(self):
+        with self.assertRaises(ParseError):
+            parse(self.body()[:-5])
+
+    def test_image_over_limit(self):
+        with mock.patch('api.parsers.MAX_IMAGE_SIZE', len(IMAGE) - 1):
+            with self.assertRaises(RequestTooLarge):
+                parse(self.body())
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_rest_over_limit(self):
+        with self.assertRaises(RequestTooLarge):
+            parse(self.body(text='x' * 200))
+        self.assert_image(parse(self.body(text='x' * 10)))
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_content_length_over_limit(self):
+        request = APIRequestFactory().post(
+            '/', self.body(), content_type='application/json'
+        )
+        request.META['CONTENT_LENGTH'] = str(10 ** 12)
+        with self.assertRaises(RequestTooLarge):
+            RecipeJSONParser().parse(
+                io.BytesIO(b'{}'), parser_context={'request': request}
+            )
+
+    def test_same_as_json_parser(self):
+        bodies = [
+            b'{}',
+            b'[]',
+            b'[1, {"image": "x"}]',
+            '{"name": "Борщ", "text": "строка\\nс \\"кавычками\\"",'
+            ' "cooking_time": 5, "tags": [1, 2],'
+            ' "ingredients": [{"id": 1, "amount": 2.5}],'
+            ' "flag": true, "none": null}'.encode(),
+            b'  {"a" : {"b": [[], {}]}, "c": "\\u0431\\\\"}  ',
+        ]
+        for body in bodies:
+            for size in (1, 3, 1024):
+                with self.subTest(body=body, chunk_size=size):
+                    self.assertEqual(
+                        parse(body, size),
+                        JSONParser().parse(io.BytesIO(body)),
+                    )
@@ -0,0 +1,50 @@
+from django.db import connection
+
+from api.tests.base import APITestCase
+
+
+class QueryCountTests(APITestCase):
+    """Количество SQL-запросов не зависит от числа строк на странице.
+
+    Если тест упал из-за нового запроса на каждую строку, нужна
+    аннотация или prefetch, а не новое число в assertNumQueries.
+    """
+
+    def assert_queries(self, client, url, count):
+        with self.assertNumQueries(count):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_recipe_list(self):
+        estimate = connection.vendor == 'postgresql'
+        self.assert_queries(
+            self.anonymous, '/api/recipes/?limit=10', 5 + estimate
+        )
+
+    def test_recipe_list_authenticated(self):
+        estimate = connection.vendor == 'postgresql'
+        self.assert_queries(
+            self.client, '/api/recipes/?limit=10', 8 + estimate
+        )
+
+    def test_recipe_detail(self):
+        self.assert_queries(
+            self.client, f'/api/recipes/{self.recipes[0].pk}/', 7
+        )
+
+    def test_user_list(self):
+        # На PostgreSQL пагинатор сначала читает оценку числа строк
+        estimate = connection.vendor == 'postgresql'
+        self.assert_queries(self.client, '/api/users/', 3 + estimate)
+
+    def test_user_detail(self):
+        self.assert_queries(self.client, f'/api/users/{self.users[1].pk}/', 2)
+
+    def test_me(self):
+        self.assert_queries(self.client, '/api/users/me/', 1)
+
+    def test_subscriptions(self):
+        self.assert_queries(
+            self.client, '/api/users/subscriptions/?recipes_limit=2', 3
+        )
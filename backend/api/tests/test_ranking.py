@@ -0,0 +1,102 @@
+from recipes.models import Recipe, RecipeActivity, RecipeScore
+from recipes.ranking import update_scores
+
+from api.relations import add_relations, remove_relations
+from api.tests.base import APITestCase
+
+
+class RankingTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        update_scores()
+        self.recipe = self.recipes[1]
+        self.url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.before = self.score()
+
+    def score(self):
+        return RecipeScore.objects.get(recipe=self.recipe).popular
+
+    def test_activity_consumed(self):
+        self.client.post(self.url)
+        self.assertTrue(RecipeActivity.objects.exists())
+        update_scores()
+        self.assertFalse(RecipeActivity.objects.exists())
+        self.assertGreater(self.score(), self.before)
+
+    def test_removal_subtracts(self):
+        self.client.post(self.url)
+        update_scores()
+        self.client.delete(self.url)
+        update_scores()
+        self.assertAlmostEqual(self.score(), self.before, places=6)
+
+    def test_toggling_does_not_inflate(self):
+        self.client.post(self.url)
+        update_scores()
+        added = self.score()
+        for _ in range(5):
+            self.client.delete(self.url)
+            self.client.post(self.url)
+        update_scores()
+        self.assertAlmostEqual(self.score(), added, places=4)
+
+    def test_batch_paths(self):
+        add_relations('favorite', self.user.pk, [self.recipe.pk])
+        update_scores()
+        self.assertGreater(self.score(), self.before)
+        remove_relations('favorite', self.user.pk, [self.recipe.pk])
+        update_scores()
+        self.assertAlmostEqual(self.score(), self.before, places=6)
+
+    def test_full_matches_incremental_order(self):
+        self.client.post(self.url)
+        update_scores()
+        incremental = list(RecipeScore.objects.order_by(
+            '-popular', 'recipe'
+        ).values_list('recipe', flat=True))
+        update_scores(full=True)
+        self.assertEqual(list(RecipeScore.objects.order_by(
+            '-popular', 'recipe'
+        ).values_list('recipe', flat=True)), incremental)
+
+    def ranked(self, ordering, cursor=False):
+        """id рецептов списка с ordering, по всем страницам курсора."""
+
+        url = f'/api/recipes/?ordering={ordering}&limit=5'
+        if cursor:
+            url += '&cursor='
+        ids = []
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next'] if cursor else None
+        return ids
+
+    def test_unscored_recipes_listed(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Новый', text='Описание',
+            cooking_time=5, image='recipes/images/recipe.png',
+        )
+        self.assertFalse(RecipeScore.objects.filter(recipe=recipe).exists())
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                ids = self.ranked(ordering, cursor=True)
+                self.assertIn(recipe.pk, ids)
+                self.assertCountEqual(
+                    ids, Recipe.objects.values_list('pk', flat=True)
+                )
+                response = self.anonymous.get(
+                    f'/api/recipes/?ordering={ordering}'
+                )
+                self.assertEqual(
+                    response.data['count'], Recipe.objects.count()
+                )
+
+    def test_before_first_update(self):
+        RecipeScore.objects.all().delete()
+        self.assertEqual(
+            self.ranked('popular', cursor=True),
+            list(Recipe.objects.order_by('-id').values_list('pk', flat=True))
+        )
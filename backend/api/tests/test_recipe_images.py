@@ -0,0 +1,104 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from recipes.models import Recipe
+
+from api.tests.base import APITestCase
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def encode_image(data):
+    return 'data:image/png;base64,' + base64.b64encode(data).decode()
+
+
+def png():
+    output = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(output, 'PNG')
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImageTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Картинка, на которую ссылаются рецепты из APITestCase.
+        path = default_storage.path(cls.recipes[0].image.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(png())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_recipe(self, image):
+        return self.client.post('/api/recipes/', {
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 5}],
+            'tags': [self.tags[0].pk],
+            'image': image,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }, format='json')
+
+    def test_upload_is_saved_before_response(self):
+        response = self.create_recipe(encode_image(png()))
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.PENDING)
+        self.assertTrue(default_storage.exists(recipe.image_upload))
+
+    def test_processed_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_recipe(encode_image(png()))
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertEqual(recipe.image_upload, '')
+        self.assertIn('full', recipe.image_variants)
+
+    def test_lost_upload_is_recovered(self):
+        """Процесс упал до обработки: картинку доделывает команда."""
+
+        response = self.create_recipe(encode_image(png()))
+        upload = Recipe.objects.get(pk=response.data['id']).image_upload
+        os.utime(default_storage.path(upload), (0, 0))
+        call_command(
+            'process_recipe_images', stdout=io.StringIO(), stderr=io.StringIO()
+        )
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertNotEqual(recipe.image.name, '')
+        self.assertFalse(default_storage.exists(upload))
+
+    def test_recent_upload_is_left_to_worker(self):
+        response = self.create_recipe(encode_image(png()))
+        call_command(
+            'process_recipe_images', stdout=io.StringIO(), stderr=io.StringIO()
+        )
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.PENDING)
+
+    def test_broken_image_fails_after_response(self):
+        with self.assertLogs('recipes.images', 'WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.create_recipe(
+                    encode_image(b'not an image')
+                )
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.FAILED)
+
+    def test_broken_base64_is_rejected(self):
+        response = self.create_recipe('data:image/png;base64,###')
+        self.assertEqual(response.status_code, 400)
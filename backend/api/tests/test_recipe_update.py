@@ -0,0 +1,142 @@
+import base64
+import io
+import re
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import RecipeIngredient
+
+from api.tests.base import APITestCase
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+WRITE = re.compile(
+    r'^(INSERT INTO|UPDATE|DELETE FROM) "recipes_recipeingredient"'
+)
+
+
+def encode_png():
+    output = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(output, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(output.getvalue()).decode())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class UpdateIngredientsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.recipes[0]
+        cls.image = encode_png()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def rows(self):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient', 'pk'))
+
+    def amounts(self):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient', 'amount'))
+
+    def update(self, amounts):
+        """PATCH рецепта; возвращает ответ и изменяющие SQL состава."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', {
+                    'ingredients': [
+                        {'id': ingredient.pk, 'amount': amount}
+                        for ingredient, amount in amounts
+                    ],
+                    'tags': [self.tags[0].pk],
+                    'image': self.image,
+                    'name': self.recipe.name,
+                    'text': self.recipe.text,
+                    'cooking_time': self.recipe.cooking_time,
+                }, format='json'
+            )
+        writes = [
+            WRITE.match(query['sql']).group(1) for query in queries
+            if WRITE.match(query['sql'])
+        ]
+        return response, writes
+
+    def test_unchanged_ingredients_not_written(self):
+        first, second = self.ingredients[:2]
+        rows = self.rows()
+        response, writes = self.update([(first, 1), (second, 1)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(writes, [])
+        self.assertEqual(self.rows(), rows)
+
+    def test_change_amount(self):
+        first, second = self.ingredients[:2]
+        rows = self.rows()
+        response, writes = self.update([(first, 7), (second, 1)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(writes, ['UPDATE'])
+        self.assertEqual(self.amounts(), {first.pk: 7, second.pk: 1})
+        self.assertEqual(self.rows(), rows)
+
+    def test_add_ingredient(self):
+        first, second, third = self.ingredients[:3]
+        rows = self.rows()
+        response, writes = self.update([(first, 1), (second, 1), (third, 3)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(writes, ['INSERT INTO'])
+        self.assertEqual(
+            self.amounts(), {first.pk: 1, second.pk: 1, third.pk: 3}
+        )
+        self.assertLessEqual(rows.items(), self.rows().items())
+
+    def test_remove_ingredient(self):
+        first, second = self.ingredients[:2]
+        rows = self.rows()
+        response, writes = self.update([(first, 1)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(writes, ['DELETE FROM'])
+        self.assertEqual(self.rows(), {first.pk: rows[first.pk]})
+
+    def test_add_remove_and_change_together(self):
+        first, second, third = self.ingredients[:3]
+        response, writes = self.update([(first, 2), (third, 3)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            sorted(writes), ['DELETE FROM', 'INSERT INTO', 'UPDATE']
+        )
+        self.assertEqual(self.amounts(), {first.pk: 2, third.pk: 3})
+
+    def test_duplicate_ingredient_rejected(self):
+        first = self.ingredients[0]
+        amounts = self.amounts()
+        response, writes = self.update([(first, 1), (first, 2)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(writes, [])
+        self.assertEqual(self.amounts(), amounts)
+
+    def test_queries_do_not_grow_with_ingredients(self):
+        first, second, third = self.ingredients[:3]
+        with CaptureQueriesContext(connection) as few:
+            response, writes = self.update(
+                [(first, 2), (second, 2), (third, 2)]
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sorted(writes), ['INSERT INTO', 'UPDATE'])
+        with CaptureQueriesContext(connection) as many:
+            response, writes = self.update(
+                [(ingredient, 3) for ingredient in self.ingredients]
+            )
+        self.assertEqual(sorted(writes), ['INSERT INTO', 'UPDATE'])
+        self.assertEqual(len(many), len(few))
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from recipes.models import Tag
+
+from api.tests.base import APITestCase
+from api.utils import touch_reference
+
+
+class ReferenceCacheTests(APITestCase):
+
+    def test_not_modified(self):
+        etag = self.anonymous.get('/api/tags/')['ETag']
+        response = self.anonymous.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_within_second_changes_etag(self):
+        etag = self.anonymous.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Новый', color='#123456', slug='new')
+        response = self.anonymous.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), len(self.tags) + 1)
+
+    def test_version_survives_cache_loss(self):
+        """Версию меняют и другие процессы: она хранится в базе."""
+
+        touch_reference(Tag)
+        etag = self.anonymous.get('/api/tags/')['ETag']
+        cache.clear()
+        self.assertEqual(self.anonymous.get('/api/tags/')['ETag'], etag)
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
+from recipes.models import FavoriteRecipe, Recipe
+
+from api.relations import (add_relations, load_relation_ids, relation_key,
+                           remove_relations)
+from api.tests.base import APITestCase
+
+
+@override_settings(SHARED_CACHE=True)
+class RelationsCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[1]
+        self.key = relation_key('favorite', self.user.pk)
+        load_relation_ids('favorite', self.user.pk)
+
+    def test_change_drops_key_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe.objects.create(user=self.user, recipe=self.recipe)
+        self.assertIsNone(cache.get(self.key))
+        self.assertIn(
+            self.recipe.pk, load_relation_ids('favorite', self.user.pk)
+        )
+
+    def test_rollback_keeps_cache(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    FavoriteRecipe.objects.create(
+                        user=self.user, recipe=self.recipe
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertNotIn(
+            self.recipe.pk, load_relation_ids('favorite', self.user.pk)
+        )
+
+    def test_api_flag_follows_change(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.assertFalse(self.client.get(url).data['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{url}favorite/')
+        self.assertTrue(self.client.get(url).data['is_favorited'])
+
+
+class LocalCacheTests(APITestCase):
+
+    @override_settings(SHARED_CACHE=False)
+    def test_not_cached_in_process_memory(self):
+        load_relation_ids('favorite', self.user.pk)
+        self.assertIsNone(cache.get(relation_key('favorite', self.user.pk)))
+
+
+class RelationsBatchTests(APITestCase):
+
+    def counts(self):
+        return dict(Recipe.objects.filter(
+            pk__in=[self.recipes[0].pk, self.recipes[1].pk]
+        ).values_list('pk', 'favorites_count'))
+
+    def test_add_counts_only_inserted(self):
+        before = self.counts()
+        result = add_relations('favorite', self.user.pk, [
+            self.recipes[0].pk, self.recipes[1].pk, 0,
+        ])
+        self.assertEqual(result, {
+            self.recipes[0].pk: 'exists',
+            self.recipes[1].pk: 'added',
+            0: 'not_found',
+        })
+        after = self.counts()
+        self.assertEqual(after[self.recipes[0].pk], before[self.recipes[0].pk])
+        self.assertEqual(
+            after[self.recipes[1].pk], before[self.recipes[1].pk] + 1
+        )
+
+    def test_remove_counts_only_deleted(self):
+        before = self.counts()
+        result = remove_relations('favorite', self.user.pk, [
+            self.recipes[0].pk, self.recipes[1].pk,
+        ])
+        self.assertEqual(result, {
+            self.recipes[0].pk: 'deleted',
+            self.recipes[1].pk: 'absent',
+        })
+        self.assertFalse(FavoriteRecipe.objects.filter(
+            user=self.user, recipe=self.recipes[0]
+        ).exists())
+        after = self.counts()
+        self.assertEqual(
+            after[self.recipes[0].pk], before[self.recipes[0].pk] - 1
+        )
+        self.assertEqual(after[self.recipes[1].pk], before[self.recipes[1].pk])
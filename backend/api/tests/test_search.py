@@ -0,0 +1,35 @@
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.search import search_recipes, update_search_index
+
+from api.tests.base import APITestCase
+
+
+class RecipeSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        basil = Ingredient.objects.create(name='Базилик', measurement_unit='г')
+        cls.in_name = Recipe.objects.create(
+            author=cls.user, name='Песто с базиликом', text='Соус',
+            cooking_time=10, image='recipes/images/recipe.png',
+        )
+        cls.in_ingredients = Recipe.objects.create(
+            author=cls.user, name='Паста', text='Ужин',
+            cooking_time=20, image='recipes/images/recipe.png',
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.in_ingredients, ingredient=basil, amount=5
+        )
+        update_search_index(Recipe.objects.values_list('pk', flat=True))
+
+    def test_name_match_ranks_first(self):
+        found = list(search_recipes(Recipe.objects.all(), 'базилик'))
+        self.assertEqual(found, [self.in_name, self.in_ingredients])
+
+    def test_search_filter(self):
+        response = self.anonymous.get('/api/recipes/', {'search': 'песто'})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.in_name.pk],
+        )
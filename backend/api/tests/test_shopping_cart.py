@@ -0,0 +1,38 @@
+from recipes.models import RecipeIngredient, ShoppingCartVersion
+
+from api.tests.base import APITestCase
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartPDFTests(APITestCase):
+
+    def download(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_cached_until_cart_changes(self):
+        first = self.download()
+        self.assertEqual(self.download(), first)
+        self.client.post(f'/api/recipes/{self.recipes[1].pk}/shopping_cart/')
+        self.assertNotEqual(self.download(), first)
+
+    def test_recipe_change_resets_carts(self):
+        first = self.download()
+        RecipeIngredient.objects.filter(recipe=self.recipes[0]).update(
+            amount=999
+        )
+        RecipeIngredient.objects.filter(
+            recipe=self.recipes[0]
+        ).first().save()
+        self.assertNotEqual(self.download(), first)
+
+    def test_version_in_database(self):
+        version = ShoppingCartVersion.objects.get(user=self.user).version
+        self.client.delete(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        )
+        self.assertEqual(ShoppingCartVersion.objects.get(
+            user=self.user
+        ).version, version + 1)
@@ -0,0 +1,223 @@
+import threading
+from unittest import mock, skipUnless
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from recipes import recommendations
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            SimilarRecipe)
+from recipes.recommendations import (IngredientMatrix, rebuild_similar,
+                                     update_similar)
+
+from api.tests.base import APITestCase
+from users.models import User
+
+
+def similar_lists():
+    lists = {}
+    for recipe_id, similar_id in SimilarRecipe.objects.order_by(
+        'recipe', 'rank'
+    ).values_list('recipe_id', 'similar_id'):
+        lists.setdefault(recipe_id, []).append(similar_id)
+    return lists
+
+
+class SimilarTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rebuild_similar()
+
+    def test_update_follows_new_composition(self):
+        first, second = self.recipes[0], self.recipes[1]
+        unique = Ingredient.objects.create(name='Шафран', measurement_unit='г')
+        RecipeIngredient.objects.filter(recipe=first).delete()
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=first, ingredient=unique, amount=1),
+            RecipeIngredient(recipe=second, ingredient=unique, amount=1),
+        ])
+        update_similar([first.pk, second.pk])
+        lists = similar_lists()
+        self.assertEqual(lists[first.pk], [second.pk])
+        self.assertIn(first.pk, lists[second.pk])
+        for recipe_id, similar in lists.items():
+            if recipe_id != second.pk:
+                self.assertNotIn(first.pk, similar)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужны параллельные транзакции')
+class ConcurrentSimilarTests(TransactionTestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='Pass12345!',
+        )
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        self.recipes = []
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/images/recipe.png',
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in ingredients[:number % 3 + 1]
+            )
+            self.recipes.append(recipe.pk)
+
+    def test_parallel_updates(self):
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def work():
+            try:
+                barrier.wait()
+                update_similar(self.recipes)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(set(similar_lists()), set(self.recipes))
+
+
+def similar_scores():
+    return {
+        (recipe_id, similar_id): score
+        for recipe_id, similar_id, score in SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'
+        )
+    }
+
+
+class CandidatePruningTests(APITestCase):
+    """Ингредиенты 0 и 1 есть во всех 16 рецептах, остальные реже."""
+
+    def rebuild(self):
+        if connection.vendor == 'postgresql':
+            # TRUNCATE невозможен при отложенных проверках ключей
+            # незавершённой транзакции теста.
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        rebuild_similar()
+
+    def test_common_ingredients_give_no_candidates(self):
+        self.rebuild()
+        exact = similar_scores()
+        with mock.patch.object(
+            recommendations, 'SIMILAR_RECIPES_MAX_FREQUENCY', 15
+        ):
+            self.rebuild()
+        pruned = similar_scores()
+        self.assertTrue(pruned)
+        # Рецепты только из ингредиентов 0 и 1.
+        only_common = {recipe.pk for recipe in self.recipes[::4]}
+        for recipe_id, similar_id in pruned:
+            self.assertNotIn(recipe_id, only_common)
+            self.assertNotIn(similar_id, only_common)
+        for pair, score in pruned.items():
+            self.assertAlmostEqual(score, exact[pair], places=5)
+
+    def test_candidates_limited(self):
+        with mock.patch.object(
+            recommendations, 'SIMILAR_RECIPES_CANDIDATES', 3
+        ):
+            self.rebuild()
+        self.assertEqual(max(map(len, similar_lists().values())), 3)
+
+    def test_changed_rows_without_copy(self):
+        matrix = IngredientMatrix.load()
+        recipe = self.recipes[2]
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredients[4], amount=1
+        )
+        updated = matrix.with_recipes([recipe.pk, self.recipes[3].pk])
+        self.assertIs(updated.base, matrix.base)
+        self.assertEqual(len(updated), len(matrix))
+
+        def lists(matrix):
+            return sorted(
+                (recipe_id, similar_id, rank)
+                for recipe_id, similar_id, _, rank in matrix.top_similar(
+                    matrix.live_rows()
+                )
+            )
+
+        self.assertEqual(lists(updated), lists(updated.compacted()))
+        self.assertNotEqual(lists(updated), lists(matrix))
+
+
+class CachedMatrixTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rebuild_similar()
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, recommendations, '_cached', None)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_similar([self.recipes[0].pk])
+        self.assertIsNotNone(recommendations._cached)
+
+    def test_reads_only_changed_rows(self):
+        recipe = self.recipes[2]
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredients[4], amount=1
+        )
+        with CaptureQueriesContext(connection) as queries:
+            update_similar([recipe.pk])
+        reads = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "recipes_recipeingredient"' in query['sql']
+        ]
+        self.assertTrue(reads)
+        for sql in reads:
+            self.assertIn('WHERE', sql)
+        self.assertTrue(all(
+            self.ingredients[4] in other.ingredients.all()
+            for other in Recipe.objects.filter(
+                pk__in=similar_lists()[recipe.pk]
+            )
+        ))
+
+    def test_deleted_recipe_drops_cache(self):
+        deleted = self.recipes[1]
+        deleted.delete()
+        update_similar([self.recipes[0].pk])
+        self.assertNotIn(deleted.pk, similar_lists()[self.recipes[0].pk])
+
+    @mock.patch.object(recommendations, 'SIMILAR_RECIPES_BATCH_SIZE', 2)
+    def test_last_places_in_one_query(self):
+        recipe = self.recipes[2]
+        RecipeIngredient.objects.filter(recipe=recipe).update(amount=5)
+        with CaptureQueriesContext(connection) as queries:
+            update_similar([recipe.pk])
+        similar = [
+            query['sql'] for query in queries.captured_queries
+            if 'recipes_similarrecipe' in query['sql']
+        ]
+        self.assertEqual(
+            len([sql for sql in similar if 'rank = ' in sql]), 1
+        )
+        self.assertEqual(
+            len([sql for sql in similar if sql.startswith('DELETE')
+                 and 'WHERE 1 = 0' not in sql]), 1
+        )
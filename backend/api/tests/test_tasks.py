@@ -0,0 +1,37 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from api.tasks import ProcessPoolRunner, ThreadPoolRunner
+
+
+@override_settings(TASK_WORKERS=1, TASK_QUEUE_SIZE=4)
+class RunnerTests(SimpleTestCase):
+
+    def wait(self, runner, submit):
+        done = threading.Event()
+        threads = []
+
+        def record(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            done.set()
+
+        submit(runner, record)
+        self.assertTrue(done.wait(30))
+        for executor in (runner.executor, runner.db_executor):
+            if executor is not None:
+                executor.shutdown()
+        return threads[0]
+
+    def test_run_uses_db_thread(self):
+        thread = self.wait(
+            ThreadPoolRunner(), lambda runner, record: runner.run(record)
+        )
+        self.assertTrue(thread.startswith('tasks-db'))
+
+    def test_process_callback_uses_db_thread(self):
+        thread = self.wait(
+            ProcessPoolRunner(),
+            lambda runner, record: runner.submit(abs, -1, callback=record),
+        )
+        self.assertTrue(thread.startswith('tasks-db'))
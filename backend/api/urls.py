@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
     AuthToken, CustomUserViewSet,
-    IngredientViewSet,
+    IngredientViewSet, JWTLogin, JWTLogout, JWTRefresh,
     RecipeViewSet, TagViewSet,
 )
 
@@ -14,16 +15,20 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
 
+auth_urls = [
+    path('token/login/', AuthToken.as_view(), name='login'),
+    path('', include('djoser.urls.authtoken')),
+]
+
+if settings.JWT_AUTH:
+    auth_urls += [
+        path('jwt/create/', JWTLogin.as_view(), name='jwt-create'),
+        path('jwt/refresh/', JWTRefresh.as_view(), name='jwt-refresh'),
+        path('jwt/logout/', JWTLogout.as_view(), name='jwt-logout'),
+    ]
+
 urlpatterns = [
-    path(
-        'auth/',
-        include(
-            [
-                path('token/login/', AuthToken.as_view(), name='login'),
-                path('', include('djoser.urls.authtoken')),
-            ]
-        ),
-    ),
+    path('auth/', include(auth_urls)),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
 ]
@@ -1,40 +1,161 @@
-import io
+import tempfile
 
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
 from reportlab.pdfgen import canvas
 
+from api.constant import PDF_SPOOL_SIZE
+from recipes.models import (Recipe, ReferenceVersion, ShoppingCart,
+                            ShoppingCartVersion)
+
+
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса или None."""
+
+    limit = request.query_params.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
+
+
+def limited_author_recipes(limit):
+    """Рецепты для списка подписок, не больше limit на автора.
+
+    Ограничение считается коррелированным подзапросом, поэтому
+    рецепты всех авторов страницы приходят одним запросом.
+    """
+
+    recipes = Recipe.objects.only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time', 'author'
+    ).order_by('-pub_date', '-id')
+    if limit is None:
+        return recipes
+    return recipes.filter(pk__in=Subquery(
+        Recipe.objects.filter(
+            author=OuterRef('author')
+        ).order_by('-pub_date', '-id').values('pk')[:limit]
+    ))
+
+
+def recipe_image_url(request, recipe, variant):
+    """Абсолютный URL варианта картинки в JPEG."""
+
+    if variant in recipe.image_variants:
+        url = default_storage.url(recipe.image_variants[variant]['jpeg'])
+    elif recipe.image:
+        url = recipe.image.url
+    else:
+        return None
+    return request.build_absolute_uri(url) if request else url
+
+
+def recipe_image_srcset(request, recipe):
+    """Варианты картинки для srcset, по одному набору на формат."""
+
+    srcset = {}
+    if not recipe.image_variants:
+        return srcset
+    variants = sorted(
+        recipe.image_variants.values(), key=lambda item: item['width']
+    )
+    for extension in ('webp', 'jpeg'):
+        urls = (default_storage.url(item[extension]) for item in variants)
+        srcset[extension] = ', '.join(
+            f'{request.build_absolute_uri(url) if request else url} '
+            f'{item["width"]}w'
+            for url, item in zip(urls, variants)
+        )
+    return srcset
+
+
+def shopping_cart_cache_key(user_id):
+    """Ключ готового PDF для текущей версии корзины пользователя."""
+
+    version = ShoppingCartVersion.objects.filter(
+        user_id=user_id
+    ).values_list('version', flat=True).first() or 0
+    return f'shopping_cart_pdf_{user_id}_{version}'
+
+
+def invalidate_shopping_carts(user_ids):
+    """Повышает версии корзин, старые PDF истекут сами."""
+
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO recipes_shoppingcartversion (user_id, version) '
+            'VALUES (%s, 1) ON CONFLICT (user_id) DO UPDATE '
+            'SET version = recipes_shoppingcartversion.version + 1',
+            [(user_id,) for user_id in user_ids],
+        )
+
+
+def invalidate_recipe_carts(recipe):
+    """Сбрасывает корзины, в которых лежит рецепт."""
+
+    invalidate_shopping_carts(ShoppingCart.objects.filter(
+        recipe=recipe
+    ).values_list('user_id', flat=True))
+
+
+def reference_version(model):
+    """Версия справочника и время её изменения (ReferenceVersion)."""
+
+    reference, _ = ReferenceVersion.objects.get_or_create(
+        pk=model._meta.label_lower
+    )
+    return reference
+
+
+def touch_reference(model):
+    """Отмечает изменение справочника, сбрасывая кэш его ответов."""
+
+    label = model._meta.label_lower
+    ReferenceVersion.objects.get_or_create(pk=label)
+    ReferenceVersion.objects.filter(pk=label).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+
+
+def draw_footer(report):
+    report.setFont('typeface', 16)
+    report.setFillColorRGB(0.25, 0.25, 0.25)
+    report.drawCentredString(
+        300, 30, 'Ваш продуктовый помощник FoodGram!'
+    )
+    report.setFillColorRGB(0, 0, 0)
+
 
 def forming_pdf(ingredients):
-    grocery_list = {}
-    download = io.BytesIO()
-    pdfmetrics.registerFont(
-        TTFont('typeface', 'fonts/typeface.ttf', 'UTF-8'))
-    for ingredient in ingredients:
-        if ingredient[0] not in grocery_list:
-            grocery_list[ingredient[0]] = {
-                'measurement_unit': ingredient[1],
-                'amount': ingredient[2]
-            }
-        else:
-            grocery_list[ingredient[0]]['amount'] += ingredient[2]
-    sorted_grocery_list = sorted(grocery_list.items(),
-                                 key=lambda item: item[0])
+    """Список покупок в PDF.
+
+    Принимает уже сгруппированные и отсортированные строки
+    (название, единица измерения, количество), переносит их
+    на новые страницы по мере заполнения и возвращает файл,
+    который держится в памяти только до PDF_SPOOL_SIZE байт.
+    """
+
+    download = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE)
     report = canvas.Canvas(download)
     report.setFont('typeface', 20)
     report.drawString(20, 800, 'Cписок продуктов в корзине:')
     height = 750
     report.setFont('typeface', 14)
-    for i, (name, data) in enumerate(sorted_grocery_list, 1):
+    for i, (name, measurement_unit, amount) in enumerate(ingredients, 1):
+        if height < 60:
+            draw_footer(report)
+            report.showPage()
+            report.setFont('typeface', 14)
+            height = 800
         report.drawString(45, height, (f'{i}. {name.capitalize()} - '
-                                       f'{data["amount"]} '
-                                       f'{data["measurement_unit"]}'))
+                                       f'{amount} '
+                                       f'{measurement_unit}'))
         height -= 30
-    report.setFont('typeface', 16)
-    report.setFillColorRGB(0.25, 0.25, 0.25)
-    report.drawCentredString(
-        300, 30, 'Ваш продуктовый помощник FoodGram!'
-    )
+    draw_footer(report)
     report.showPage()
     report.save()
     download.seek(0)
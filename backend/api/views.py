@@ -1,3 +1,7 @@
+import io
+
+from django.core.cache import cache
+from django.db.models import F, Prefetch, Sum, Value
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -12,20 +16,37 @@ from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from api.authentication import revoke_token
+from api.constant import (SHOPPING_CART_CACHE_MAX_SIZE,
+                          SHOPPING_CART_CACHE_TIMEOUT, SIMILAR_RECIPES_LIMIT,
+                          SIMILAR_RECIPES_TOP_K)
 from api.filters import IngredientSearchFilter, RecipeFilter
-from api.pagination import CustomPagination
+from api.mixins import CachedReadOnlyViewSet
+from api.pagination import (CustomPagination, FeedPagination,
+                            RecipePagination, SubscriptionPagination)
+from api.parsers import RecipeJSONParser
 from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.relations import (add_relations, load_relation_ids,
+                           remove_relations)
 from api.serializers import (
     CustomUserSerializer, FavoriteCreateDeleteSerializer,
     FollowSerializer, FollowShowSerializer,
     GetTokenSerializer, IngredientSerializer,
-    RecipeCreateSerializer, RecipeListSerializer,
+    JWTLogoutSerializer, JWTRefreshSerializer,
+    RecipeCreateSerializer, RecipeListSerializer, RelationsBatchSerializer,
     ShoppingCartCreateDeleteSerializer, TagSerializer)
-from api.utils import forming_pdf
+from api.utils import (forming_pdf, get_recipes_limit,
+                       limited_author_recipes, shopping_cart_cache_key)
+from recipes.feed import feed_sources
+from recipes.recommendations import cook_from_cart
 from users.models import User
 
 
@@ -49,6 +70,25 @@ class BaseRelationsViewSet:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def relations_batch(self, request, kind):
+        """Добавление (POST) или удаление (DELETE) связей пачкой."""
+
+        serializer = RelationsBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = (
+            add_relations if request.method == 'POST' else remove_relations
+        )
+        result = change(
+            kind, request.user.id, serializer.validated_data['ids']
+        )
+        return Response(
+            {'results': [
+                {'id': target_id, 'status': state}
+                for target_id, state in result.items()
+            ]},
+            status=status.HTTP_200_OK,
+        )
+
 
 class AuthToken(ObtainAuthToken):
     """Авторизация"""
@@ -66,7 +106,38 @@ class AuthToken(ObtainAuthToken):
                         status=status.HTTP_200_OK)
 
 
-class CustomUserViewSet(views.UserViewSet):
+class JWTLogin(AuthToken):
+    """Выдача пары JWT (access, refresh) по почте и паролю."""
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        refresh = RefreshToken.for_user(serializer.validated_data['user'])
+        return Response(
+            {'access': str(refresh.access_token), 'refresh': str(refresh)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class JWTRefresh(TokenRefreshView):
+    serializer_class = JWTRefreshSerializer
+
+
+class JWTLogout(APIView):
+    """Отзыв refresh и текущего access токена."""
+
+    permission_classes = (AllowAny, )
+
+    def post(self, request):
+        serializer = JWTLogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        revoke_token(serializer.validated_data['refresh'])
+        if isinstance(request.auth, AccessToken):
+            revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CustomUserViewSet(BaseRelationsViewSet, views.UserViewSet):
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
@@ -127,6 +198,17 @@ class CustomUserViewSet(views.UserViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        permission_classes=(IsAuthenticated,)
+    )
+    def subscribe_batch(self, request):
+        """Подписка/отписка от нескольких авторов: {"ids": [...]}."""
+
+        return self.relations_batch(request, 'follow')
+
     @action(
         detail=False,
         methods=['get'],
@@ -137,8 +219,17 @@ class CustomUserViewSet(views.UserViewSet):
     def get_subscriptions(self, request):
         """Список пользователей, на которых есть подписка."""
 
-        authors = User.objects.filter(author__follower=request.user)
-        paginator = CustomPagination()
+        authors = User.objects.filter(
+            author__follower=request.user
+        ).annotate(
+            follow_id=F('author__id'),
+            is_subscribed=Value(True),
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=limited_author_recipes(get_recipes_limit(request)),
+            to_attr='subscription_recipes',
+        ))
+        paginator = SubscriptionPagination()
         result_pages = paginator.paginate_queryset(
             queryset=authors, request=request
         )
@@ -148,17 +239,16 @@ class CustomUserViewSet(views.UserViewSet):
         return paginator.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedReadOnlyViewSet):
     """Список ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter, )
-    search_fields = ('^name', )
     pagination_class = None
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedReadOnlyViewSet):
     """Список тегов."""
 
     queryset = Tag.objects.all()
@@ -170,13 +260,27 @@ class RecipeViewSet(BaseRelationsViewSet, viewsets.ModelViewSet):
     """Рецепты."""
 
     queryset = Recipe.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         IsAuthorOrAdminOrReadOnly
     )
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
+    parser_classes = (RecipeJSONParser, FormParser, MultiPartParser)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'feed'):
+            queryset = queryset.exclude(image='')
+        return queryset.defer('search_vector').prefetch_related(
+            'tags',
+            'author',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -218,17 +322,104 @@ class RecipeViewSet(BaseRelationsViewSet, viewsets.ModelViewSet):
             pk
         )
 
+    @action(methods=['post', 'delete'], detail=False, url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        """Избранное для нескольких рецептов: {"ids": [...]}."""
+
+        return self.relations_batch(request, 'favorite')
+
+    @action(methods=['post', 'delete'], detail=False,
+            url_path='shopping_cart', permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        """Корзина для нескольких рецептов: {"ids": [...]}."""
+
+        return self.relations_batch(request, 'shopping')
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов из подписок, по курсору."""
+
+        paginator = FeedPagination()
+        entries = paginator.paginate_queryset(
+            feed_sources(request.user), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = RecipeListSerializer(
+            [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_similar_limit(self):
+        limit = self.request.query_params.get('limit')
+        if limit and limit.isdigit():
+            return min(int(limit), SIMILAR_RECIPES_TOP_K)
+        return SIMILAR_RECIPES_LIMIT
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Рецепты, похожие по составу, из заранее посчитанных списков."""
+
+        recipes = list(self.get_queryset().filter(
+            similar_to__recipe_id=pk
+        ).order_by('similar_to__rank')[:self.get_similar_limit()])
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def cook_from_cart(self, request):
+        """Что ещё приготовить из продуктов, которые уже в корзине."""
+
+        recipe_ids = cook_from_cart(
+            load_relation_ids('shopping', request.user.id),
+            self.get_similar_limit(),
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
+        cache_key = shopping_cart_cache_key(request.user.id)
+        pdf = cache.get(cache_key)
+        if pdf is not None:
+            return FileResponse(
+                io.BytesIO(pdf),
+                as_attachment=True,
+                filename='shopping_cart.pdf', )
         ingredients = RecipeIngredient.objects.filter(
             recipe__shopping__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by(
+            'ingredient__name', 'ingredient__measurement_unit'
         ).values_list(
-            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+            'ingredient__name', 'ingredient__measurement_unit', 'total'
         )
+        download = forming_pdf(ingredients.iterator())
+        if download.seek(0, io.SEEK_END) <= SHOPPING_CART_CACHE_MAX_SIZE:
+            download.seek(0)
+            cache.set(
+                cache_key, download.read(), SHOPPING_CART_CACHE_TIMEOUT
+            )
+        download.seek(0)
         return FileResponse(
-            forming_pdf(ingredients),
+            download,
             as_attachment=True,
             filename='shopping_cart.pdf', )
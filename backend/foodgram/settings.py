@@ -1,6 +1,9 @@
 import os
+import sys
+from datetime import timedelta
 
 from pathlib import Path
+from django.utils.module_loading import import_string
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +14,8 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-cg6*%6d51ef8f#4!r3*$vmxm4)
 
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
+TESTING = sys.argv[1:2] == ['test']
+
 # ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS')
 ALLOWED_HOSTS = ['*']
 
@@ -25,7 +30,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'colorfield',
-    'debug_toolbar',
     'django_filters',
     'djoser',
     'rest_framework',
@@ -36,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,9 +49,51 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Доля запросов с подробным замером (Server-Timing, лог, SQL в /metrics)
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.1))
+# /metrics отдаётся только с заголовком Authorization: Bearer <токен>,
+# без токена - только при DEBUG
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Поиск N+1: off, warn (лог с местом вызова) или raise (в тестах)
+NPLUSONE_MODE = os.getenv(
+    'NPLUSONE_MODE', 'raise' if TESTING else 'off'
+)
+# Сколько одинаковых по форме запросов допустимо за один запрос API
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 3))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'performance': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['performance'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'api.nplusone': {
+            'handlers': ['performance'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -85,6 +133,39 @@ else:
         }
     }
 
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+# locmem виден только своему процессу, поэтому данные, которые
+# меняют запросы к другим процессам, в нём не кэшируются
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+        }
+    }
+    # Подмена соединения, например fakeredis.FakeConnection в тестах
+    if os.getenv('REDIS_CONNECTION_CLASS'):
+        CACHES['default']['OPTIONS'] = {
+            'CONNECTION_POOL_KWARGS': {
+                'connection_class': import_string(os.getenv('REDIS_CONNECTION_CLASS')),
+            },
+        }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', default='/var/tmp/foodgram_cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +197,18 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSV_FILES_DIR = os.path.join(BASE_DIR, 'data')
 
+PDF_FONT_PATH = os.path.join(BASE_DIR, 'fonts', 'typeface.ttf')
+
+# Фоновая работа (картинки, ленты, похожие рецепты):
+# api.tasks.ThreadPoolRunner, api.tasks.ProcessPoolRunner
+# или api.tasks.InlineRunner (для тестов)
+TASK_RUNNER = os.getenv(
+    'TASK_RUNNER',
+    'api.tasks.InlineRunner' if TESTING else 'api.tasks.ThreadPoolRunner'
+)
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', 2))
+TASK_QUEUE_SIZE = int(os.getenv('TASK_QUEUE_SIZE', 16))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -123,7 +216,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': [
         'rest_framework.pagination.PageNumberPagination',
@@ -135,6 +228,27 @@ REST_FRAMEWORK = {
     ]
 }
 
+# JWT рядом с токенами DRF: /api/auth/jwt/create|refresh|logout/
+# Требует общего кэша (SHARED_CACHE), см. api.checks
+JWT_AUTH = os.getenv('JWT_AUTH', 'False').lower() == 'true'
+
+if JWT_AUTH:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].append(
+        'api.authentication.CachedJWTAuthentication'
+    )
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', 5))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', 7))
+    ),
+    'ROTATE_REFRESH_TOKENS': True,
+    'UPDATE_LAST_LOGIN': False,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
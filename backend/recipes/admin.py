@@ -3,6 +3,7 @@ from django.contrib import admin
 from api.constant import PAGE
 from .models import (FavoriteRecipe, Follow, Ingredient, Recipe,
                      RecipeIngredient, ShoppingCart, Tag)
+from .search import update_search_index
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -30,10 +31,15 @@ class RecipeAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags', )
     empty_value_display = '-пусто-'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.pk])
+
     def get_favorite_count(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     get_favorite_count.short_description = 'Добавлений в избранное'
+    get_favorite_count.admin_order_field = 'favorites_count'
 
 
 @admin.register(RecipeIngredient)
@@ -0,0 +1,123 @@
+"""Лента подписок.
+
+Новый рецепт раскладывается по лентам подписчиков автора
+(FeedEntry) одним INSERT ... SELECT в фоне. Рецепты авторов,
+у которых подписчиков больше FEED_FANOUT_LIMIT, не раскладываются,
+а читаются при показе ленты и сливаются с материализованной частью.
+При подписке в ленту попадают только FEED_BACKFILL_LIMIT последних
+рецептов автора, более старые остаются на его странице.
+
+Раскладка идёт в очереди api.tasks и теряется, если процесс упал
+раньше неё. Такие рецепты возвращает в ленты rebuild_feed: её
+стоит запускать по расписанию (например, раз в сутки) и после
+аварийного перезапуска.
+"""
+from django.db import connection
+from django.db.models import F
+
+from api.constant import FEED_BACKFILL_LIMIT, FEED_FANOUT_LIMIT
+from recipes.loaders import conflict_sql
+from recipes.models import FeedEntry, Follow, Recipe
+
+INSERT_ENTRIES = (
+    'INSERT INTO recipes_feedentry '
+    '(follower_id, recipe_id, author_id, pub_date) '
+)
+# Рецепты авторов с номером от нового к старому.
+LATEST_RECIPES = (
+    '(SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+    'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+    ') AS position FROM recipes_recipe{where}) r'
+)
+
+
+def insert_entries(select, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            INSERT_ENTRIES + select
+            + conflict_sql(('follower_id', 'recipe_id'), ()),
+            params,
+        )
+
+
+def fan_out(recipe_id):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+
+    insert_entries(
+        'SELECT f.follower_id, r.id, r.author_id, r.pub_date '
+        'FROM recipes_recipe r '
+        'JOIN recipes_follow f ON f.author_id = r.author_id '
+        'JOIN users_user u ON u.id = r.author_id '
+        'WHERE r.id = %s AND u.followers_count <= %s',
+        [recipe_id, FEED_FANOUT_LIMIT],
+    )
+
+
+def follow_authors(follower_id, author_ids):
+    """Добавляет в ленту рецепты авторов новой подписки."""
+
+    author_ids = list(author_ids)
+    if not author_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    insert_entries(
+        'SELECT %s, r.id, r.author_id, r.pub_date FROM '
+        + LATEST_RECIPES.format(
+            where=f' WHERE author_id IN ({placeholders})'
+        )
+        + ' JOIN users_user u ON u.id = r.author_id '
+        'WHERE r.position <= %s AND u.followers_count <= %s',
+        [
+            follower_id, *author_ids,
+            FEED_BACKFILL_LIMIT, FEED_FANOUT_LIMIT,
+        ],
+    )
+
+
+def unfollow_authors(follower_id, author_ids):
+    """Убирает из ленты рецепты авторов, от которых отписались."""
+
+    FeedEntry.objects.filter(
+        follower_id=follower_id, author_id__in=list(author_ids)
+    ).delete()
+
+
+def rebuild_feed():
+    """Собирает все ленты заново по текущим подпискам."""
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE recipes_feedentry')
+    else:
+        FeedEntry.objects.all().delete()
+    insert_entries(
+        'SELECT f.follower_id, r.id, r.author_id, r.pub_date '
+        'FROM recipes_follow f JOIN '
+        + LATEST_RECIPES.format(where='')
+        + ' ON r.author_id = f.author_id '
+        'JOIN users_user u ON u.id = f.author_id '
+        'WHERE r.position <= %s AND u.followers_count <= %s',
+        [FEED_BACKFILL_LIMIT, FEED_FANOUT_LIMIT],
+    )
+    return FeedEntry.objects.count()
+
+
+def feed_sources(user):
+    """Источники ленты пользователя для FeedPagination.
+
+    Строки каждого источника имеют pub_date и recipe_id: записи
+    ленты и рецепты авторов, которые по лентам не раскладываются.
+    """
+
+    sources = [
+        FeedEntry.objects.filter(follower=user).only('recipe', 'pub_date')
+    ]
+    heavy_authors = list(Follow.objects.filter(
+        follower=user, author__followers_count__gt=FEED_FANOUT_LIMIT
+    ).values_list('author', flat=True))
+    if heavy_authors:
+        sources.append(
+            Recipe.objects.filter(author__in=heavy_authors)
+            .annotate(recipe_id=F('id')).only('pub_date')
+        )
+    return sources
@@ -0,0 +1,204 @@
+"""Обработка картинок рецептов.
+
+Загруженная картинка декодируется один раз, поворачивается
+по EXIF и сохраняется без метаданных в нескольких размерах
+(IMAGE_VARIANTS) в форматах WebP и JPEG. Файлы лежат в каталоге,
+имя которого - sha256 исходных байтов, поэтому одинаковые
+загрузки не дублируются.
+
+Исходный файл сохраняется в UPLOAD_DIR ещё в запросе и удаляется
+после обработки. Если процесс упал раньше, картинку доделает
+команда process_recipe_images.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from functools import partial
+from uuid import uuid4
+
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from api.constant import IMAGE_QUALITY, IMAGE_VARIANTS
+from api.tasks import get_runner
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = 'recipes/images'
+UPLOAD_DIR = 'recipes/uploads'
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def variant_size(size, max_width):
+    width, height = size
+    if width <= max_width:
+        return width, height
+    return max_width, max(1, round(height * max_width / width))
+
+
+def variant_name(digest, variant, extension):
+    return f'{IMAGE_DIR}/{digest[:2]}/{digest}/{variant}.{extension}'
+
+
+def describe_variants(digest, size):
+    """Пути и размеры всех вариантов картинки."""
+
+    variants = {}
+    for variant, max_width in IMAGE_VARIANTS.items():
+        width, height = variant_size(size, max_width)
+        variants[variant] = {
+            'width': width,
+            'height': height,
+            **{
+                extension: variant_name(digest, variant, extension)
+                for extension in FORMATS
+            },
+        }
+    return variants
+
+
+def encode(image, extension):
+    output = io.BytesIO()
+    if extension == 'jpeg':
+        image.save(
+            output, FORMATS[extension], quality=IMAGE_QUALITY[extension],
+            optimize=True, progressive=True,
+        )
+    else:
+        image.save(
+            output, FORMATS[extension], quality=IMAGE_QUALITY[extension],
+            method=4,
+        )
+    return output.getvalue()
+
+
+def prepare(image):
+    """Поворот по EXIF и перевод в RGB, метаданные не переносятся."""
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_recipe_image(data):
+    """Декодирует картинку и кодирует все её варианты.
+
+    Не обращается к базе и хранилищу, поэтому может выполняться
+    в отдельном процессе. Возвращает (варианты, {путь: байты}).
+    """
+
+    if hasattr(data, 'read'):
+        data.seek(0)
+        data = data.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        image = prepare(source)
+    variants = describe_variants(digest, image.size)
+    files = {}
+    for variant in IMAGE_VARIANTS:
+        resized = image
+        size = (variants[variant]['width'], variants[variant]['height'])
+        if size != image.size:
+            resized = image.resize(size, Image.LANCZOS)
+        for extension in FORMATS:
+            files[variants[variant][extension]] = encode(resized, extension)
+    return variants, files
+
+
+def save_rendered_image(variants, files):
+    """Сохраняет файлы вариантов, уже лежащие в хранилище пропускает.
+
+    Возвращает путь к полноразмерному JPEG для Recipe.image.
+    """
+
+    full_name = variants['full']['jpeg']
+    if not default_storage.exists(full_name):
+        for variant in IMAGE_VARIANTS:
+            for extension in FORMATS:
+                name = variants[variant][extension]
+                default_storage.save(name, ContentFile(files[name]))
+    return full_name
+
+
+def store_recipe_image(data):
+    """Обрабатывает и сохраняет картинку, возвращает (имя, варианты)."""
+
+    variants, files = render_recipe_image(data)
+    return save_rendered_image(variants, files), variants
+
+
+def decode_base64_image(encoded):
+    """Байты картинки из строки вида data:image/...;base64,...."""
+
+    if ';base64,' in encoded:
+        encoded = encoded.split(';base64,', 1)[1]
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Картинка не в формате base64.')
+
+
+def save_upload(image):
+    """Сохраняет исходную картинку до обработки, возвращает имя файла."""
+
+    image.seek(0)
+    return default_storage.save(f'{UPLOAD_DIR}/{uuid4().hex}', File(image))
+
+
+def read_upload(upload):
+    with default_storage.open(upload, 'rb') as file:
+        return file.read()
+
+
+def process_recipe_image(recipe_id, upload, image=None):
+    """Ставит обработку картинки рецепта в очередь.
+
+    upload - сохранённый исходный файл, image - он же в памяти
+    запроса, если есть, чтобы не читать его заново.
+
+    Пока она идёт, у рецепта статус pending, после неё картинка
+    и варианты записываются в рецепт, статус становится ready
+    (или failed, если картинку не удалось прочитать).
+    """
+
+    runner = get_runner()
+    if image is None:
+        image = read_upload(upload)
+    elif not runner.shares_memory:
+        image.seek(0)
+        image = image.read()
+    runner.submit(
+        render_recipe_image, image,
+        callback=partial(apply_recipe_image, recipe_id, upload),
+    )
+
+
+def apply_recipe_image(recipe_id, upload, result=None, error=None):
+    """Записывает результат, если рецепт ждёт именно эту загрузку."""
+
+    recipes = Recipe.objects.filter(pk=recipe_id, image_upload=upload)
+    if error is not None:
+        logger.warning(
+            'Не удалось обработать картинку рецепта %s: %s', recipe_id, error
+        )
+        recipes.update(
+            image_status=Recipe.ImageStatus.FAILED, image_upload=''
+        )
+    else:
+        variants, files = result
+        recipes.update(
+            image=save_rendered_image(variants, files),
+            image_variants=variants,
+            image_status=Recipe.ImageStatus.READY,
+            image_upload='',
+        )
+    default_storage.delete(upload)
@@ -0,0 +1,228 @@
+"""Потоковая загрузка справочников из CSV и JSON.
+
+Файл читается по одной записи, записи собираются в пачки
+по --batch-size и записываются одним запросом
+INSERT ... ON CONFLICT, поэтому повторная загрузка того же
+файла ничего не ломает. На PostgreSQL пачка передаётся через
+COPY во временную таблицу.
+"""
+import csv
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.utils import touch_reference
+
+JSON_CHUNK = 64 * 1024
+COPY_NULL = '\\N'
+
+
+def read_csv(path, fields):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                yield dict(zip(fields, row))
+
+
+def read_json(path):
+    """Объекты из JSON-массива или JSON Lines, без чтения файла целиком."""
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    with open(path, encoding='utf-8') as file:
+        while True:
+            chunk = file.read(JSON_CHUNK)
+            buffer += chunk
+            position = 0
+            while True:
+                while (position < len(buffer)
+                       and buffer[position] in '[], \t\r\n'):
+                    position += 1
+                if position == len(buffer):
+                    break
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if not chunk:
+                        raise CommandError(
+                            f'Некорректный JSON в {path}: {buffer[:80]!r}'
+                        )
+                    break
+                yield record
+            buffer = buffer[position:]
+            if not chunk:
+                return
+
+
+def read_records(path, fields):
+    if os.path.splitext(path)[1].lower() in ('.json', '.jsonl'):
+        return read_json(path)
+    return read_csv(path, fields)
+
+
+def batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def conflict_sql(conflict_fields, update_fields):
+    if not conflict_fields:
+        return ''
+    quote = connection.ops.quote_name
+    conflict = ', '.join(map(quote, conflict_fields))
+    if not update_fields:
+        return f' ON CONFLICT ({conflict}) DO NOTHING'
+    updates = ', '.join(
+        f'{quote(name)} = excluded.{quote(name)}' for name in update_fields
+    )
+    return f' ON CONFLICT ({conflict}) DO UPDATE SET {updates}'
+
+
+def insert_rows(model, columns, rows, conflict_fields=(), update_fields=()):
+    """Вставляет кортежи значений columns в таблицу model без ORM.
+
+    Значения должны быть уже подготовлены для базы. С conflict_fields
+    совпадающие строки пропускаются или обновляются update_fields.
+    Возвращает количество записанных строк.
+    """
+
+    if connection.vendor == 'postgresql':
+        return copy_rows(model, columns, rows, conflict_fields, update_fields)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = ', '.join(map(quote, columns))
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    on_conflict = conflict_sql(conflict_fields, update_fields)
+    max_params = connection.features.max_query_params
+    size = max_params // len(columns) if max_params else len(rows)
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in batched(rows, size):
+            cursor.execute(
+                f'INSERT INTO {table} ({names}) VALUES '
+                + ', '.join([placeholders] * len(batch)) + on_conflict,
+                [value for row in batch for value in row],
+            )
+            written += cursor.rowcount
+    return written
+
+
+def copy_rows(model, columns, rows, conflict_fields, update_fields):
+    """Вставка через COPY, при upsert - через временную таблицу."""
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = ', '.join(map(quote, columns))
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [COPY_NULL if value is None else value for value in row]
+        for row in rows
+    )
+    buffer.seek(0)
+    copy = f'({names}) FROM STDIN WITH (FORMAT csv, NULL \'{COPY_NULL}\')'
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not conflict_fields:
+            cursor.copy_expert(f'COPY {table} {copy}', buffer)
+            return cursor.rowcount
+        cursor.execute(
+            f'CREATE TEMP TABLE load_rows ON COMMIT DROP AS '
+            f'SELECT {names} FROM {table} WITH NO DATA'
+        )
+        cursor.copy_expert(f'COPY load_rows {copy}', buffer)
+        cursor.execute(
+            f'INSERT INTO {table} ({names}) SELECT {names} FROM load_rows'
+            + conflict_sql(conflict_fields, update_fields)
+        )
+        written = cursor.rowcount
+        cursor.execute('DROP TABLE load_rows')
+    return written
+
+
+class LoadCommand(BaseCommand):
+    """Загрузка справочника с upsert по conflict_fields.
+
+    При совпадении ключа обновляются update_fields, если их нет -
+    строка пропускается.
+    """
+
+    model = None
+    fields = ()
+    conflict_fields = ()
+    update_fields = ()
+    default_file = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.CSV_FILES_DIR, self.default_file),
+            help='Файл CSV (без заголовка) или JSON.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество записей в одном запросе.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только прочитать и проверить файл.'
+        )
+
+    def clean(self, record):
+        """Запись в виде кортежа значений fields или None."""
+
+        values = []
+        for name in self.fields:
+            value = str(record.get(name) or '').strip()
+            max_length = self.model._meta.get_field(name).max_length
+            if not value or (max_length and len(value) > max_length):
+                return None
+            values.append(value)
+        return tuple(values)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла {path}')
+        started = time.monotonic()
+        read = skipped = written = 0
+        for batch in batched(
+            read_records(path, self.fields), options['batch_size']
+        ):
+            rows = {}
+            for record in batch:
+                row = self.clean(record)
+                if row is None:
+                    skipped += 1
+                    continue
+                rows[tuple(
+                    row[self.fields.index(name)]
+                    for name in self.conflict_fields
+                )] = row
+            read += len(batch)
+            if not options['dry_run'] and rows:
+                written += self.upsert(list(rows.values()))
+        elapsed = time.monotonic() - started
+        if not options['dry_run']:
+            touch_reference(self.model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: прочитано {read}, пропущено {skipped}, '
+            f'записано {written} за {elapsed:.2f} с '
+            f'({read / elapsed if elapsed else read:.0f} записей/с)'
+            + (', без записи (--dry-run)' if options['dry_run'] else '')
+        ))
+
+    def upsert(self, rows):
+        return insert_rows(
+            self.model, self.fields, rows,
+            self.conflict_fields, self.update_fields,
+        )
@@ -0,0 +1,337 @@
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import store_recipe_image
+from recipes.loaders import insert_rows
+from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+# Цвета заглушек картинок, одна заглушка на цвет.
+IMAGE_COLORS = ('#82ac64', '#ff6e12', '#b49adf', '#e8c547', '#5c80bc')
+
+
+class Zipf:
+    """Выбор индексов 0..size-1 с вероятностью ~ 1 / (ранг ** skew).
+
+    Небольшое число популярных авторов, ингредиентов и рецептов
+    получает основную часть подписок, упоминаний и избранного.
+    """
+
+    def __init__(self, rng, size, skew):
+        self.rng = rng
+        self.population = range(size)
+        self.cum_weights = list(accumulate(
+            1 / (rank ** skew) for rank in range(1, size + 1)
+        ))
+
+    def choice(self):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights
+        )[0]
+
+    def sample(self, count):
+        """count разных индексов (не больше размера выборки)."""
+
+        count = min(count, len(self.population))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(
+                self.population, cum_weights=self.cum_weights,
+                k=count - len(chosen),
+            ))
+        return chosen
+
+
+class Rows:
+    """Строки таблицы model для insert_rows.
+
+    Поля, не переданные в row(), заполняются значениями по умолчанию
+    модели, подготовленными для базы один раз.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.defaults = {
+            field.column: field.get_db_prep_save(
+                field.get_default(), connection
+            )
+            for field in model._meta.concrete_fields
+            if field.attname not in fields and not field.primary_key
+        }
+        self.columns = tuple(fields) + tuple(self.defaults)
+        self.tail = tuple(self.defaults.values())
+
+    def row(self, *values):
+        return values + self.tail
+
+    def insert(self, rows):
+        with transaction.atomic():
+            insert_rows(self.model, self.columns, rows)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def placeholder_images():
+    images = []
+    for color in IMAGE_COLORS:
+        data = io.BytesIO()
+        Image.new('RGB', (1280, 960), color).save(data, 'JPEG')
+        images.append(store_recipe_image(data.getvalue()))
+    return images
+
+
+class Command(BaseCommand):
+    help = ('Генерация пользователей, рецептов, подписок, избранного '
+            'и покупок для нагрузочного тестирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Среднее количество подписок пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее количество рецептов в избранном.'
+        )
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее количество рецептов в корзине.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Среднее количество ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты публикации.'
+        )
+        parser.add_argument('--skew', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='fake')
+        parser.add_argument(
+            '--skip-index', action='store_true',
+            help='Не пересчитывать поисковый индекс.'
+        )
+        parser.add_argument(
+            '--skip-feed', action='store_true',
+            help='Не собирать ленты подписок (rebuild_feed).'
+        )
+        parser.add_argument(
+            '--skip-scores', action='store_true',
+            help='Не пересчитывать рейтинги (update_scores --full).'
+        )
+        parser.add_argument(
+            '--skip-similar', action='store_true',
+            help=('Не пересчитывать похожие рецепты (rebuild_similar): '
+                  'на больших наборах это дольше всей генерации.')
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', 'name')
+        )
+        self.tags = list(Tag.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        if not self.ingredients or not self.tags:
+            raise CommandError(
+                'Сначала загрузите справочники: load_ingredients, load_tags'
+            )
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        users = self.stage('пользователи', self.create_users)
+        recipes = self.stage('рецепты', self.create_recipes, users)
+        self.stage('подписки', self.create_follows, users)
+        self.stage(
+            'избранное', self.create_user_recipes,
+            FavoriteRecipe, users, recipes, options['favorites'],
+        )
+        self.stage(
+            'корзины', self.create_user_recipes,
+            ShoppingCart, users, recipes, options['cart'],
+        )
+        self.stage('счётчики', self.call, 'rebuild_counters')
+        if not options['skip_feed']:
+            self.stage('ленты', self.call, 'rebuild_feed')
+        if not options['skip_scores']:
+            self.stage('рейтинги', self.call, 'update_scores', '--full')
+        if not options['skip_similar']:
+            self.stage('похожие рецепты', self.call, 'rebuild_similar')
+        if not options['skip_index']:
+            self.stage('поисковый индекс', self.call,
+                       'rebuild_search_index')
+
+    def call(self, name, *args):
+        return call_command(
+            name, *args, stdout=self.stdout, stderr=self.stderr
+        )
+
+    def stage(self, title, method, *args):
+        started = time.monotonic()
+        result = method(*args)
+        self.stdout.write(
+            f'{title}: {time.monotonic() - started:.1f} с'
+        )
+        return result
+
+    def count(self, mean):
+        """Количество с экспоненциальным распределением и средним mean."""
+
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def reset_sequences(self, *models):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def fill(self, tables, total, make):
+        """Вызывает make(номер) total раз и вставляет строки пачками.
+
+        make возвращает список строк для каждой таблицы из tables.
+        """
+
+        batches = [[] for _ in tables]
+        for number in range(total):
+            for batch, rows in zip(batches, make(number)):
+                batch.extend(rows)
+            if len(batches[0]) >= self.batch_size or number == total - 1:
+                with transaction.atomic():
+                    for table, batch in zip(tables, batches):
+                        if batch:
+                            table.insert(batch)
+                        batch.clear()
+
+    def create_users(self):
+        first = next_pk(User)
+        total = self.options['users']
+        prefix = self.options['prefix']
+        users = Rows(User, (
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'password', 'date_joined',
+        ))
+        password = make_password('fake-password')
+        joined = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        def make(number):
+            pk = first + number
+            return [[users.row(
+                pk, f'{prefix}{pk}@example.com', f'{prefix}{pk}',
+                prefix, str(pk), password, joined,
+            )]]
+
+        self.fill([users], total, make)
+        self.reset_sequences(User)
+        return range(first, first + total)
+
+    def create_recipes(self, users):
+        first = next_pk(Recipe)
+        total = self.options['recipes']
+        image_field = Recipe._meta.get_field('image_variants')
+        images = [
+            (image, image_field.get_db_prep_save(variants, connection))
+            for image, variants in placeholder_images()
+        ]
+        recipes = Rows(Recipe, (
+            'id', 'author_id', 'name', 'text', 'image', 'image_variants',
+            'cooking_time', 'pub_date',
+        ))
+        recipe_ingredients = Rows(
+            RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount')
+        )
+        recipe_tags = Rows(Recipe.tags.through, ('recipe_id', 'tag_id'))
+        authors = Zipf(self.rng, len(users), self.options['skew'])
+        ingredients = Zipf(
+            self.rng, len(self.ingredients), self.options['skew']
+        )
+        step = timedelta(days=self.options['days']) / max(total, 1)
+        start = timezone.now() - step * total
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+
+        def make(number):
+            pk = first + number
+            image, variants = self.rng.choice(images)
+            chosen = [
+                self.ingredients[index] for index in ingredients.sample(
+                    1 + self.count(self.options['ingredients'] - 1)
+                )
+            ]
+            tags = self.rng.sample(
+                self.tags, self.rng.randint(1, min(3, len(self.tags)))
+            )
+            return [
+                [recipes.row(
+                    pk, users[authors.choice()],
+                    f'{chosen[0][1].capitalize()} №{pk}',
+                    ', '.join(name for _, name in chosen),
+                    image, variants, self.rng.randint(1, 180),
+                    adapt_datetime(start + step * number),
+                )],
+                [
+                    recipe_ingredients.row(
+                        pk, ingredient_id, self.rng.randint(1, 500)
+                    )
+                    for ingredient_id, _ in chosen
+                ],
+                [recipe_tags.row(pk, tag_id) for tag_id in tags],
+            ]
+
+        self.fill(
+            [recipes, recipe_ingredients, recipe_tags], total, make
+        )
+        self.reset_sequences(Recipe)
+        return range(first, first + total)
+
+    def create_follows(self, users):
+        follows = Rows(Follow, ('follower_id', 'author_id'))
+        authors = Zipf(self.rng, len(users), self.options['skew'])
+
+        def make(number):
+            follower = users[number]
+            return [[
+                follows.row(follower, users[index])
+                for index in authors.sample(
+                    self.count(self.options['follows'])
+                )
+                if users[index] != follower
+            ]]
+
+        self.fill([follows], len(users), make)
+
+    def create_user_recipes(self, model, users, recipes, mean):
+        """Избранное или корзины: популярность рецептов не зависит от id."""
+
+        if not recipes:
+            return
+        rows = Rows(model, ('user_id', 'recipe_id'))
+        ranking = list(recipes)
+        self.rng.shuffle(ranking)
+        popular = Zipf(self.rng, len(ranking), self.options['skew'])
+
+        def make(number):
+            return [[
+                rows.row(users[number], ranking[index])
+                for index in popular.sample(self.count(mean))
+            ]]
+
+        self.fill([rows], len(users), make)
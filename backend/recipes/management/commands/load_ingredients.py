@@ -1,23 +1,11 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.loaders import LoadCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
-    help = 'Загрузка файла csv.'
+class Command(LoadCommand):
+    help = 'Загрузка ингредиентов из CSV или JSON.'
 
-    def handle(self, *args, **options):
-        with open('./data/ingredients.csv', 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            ingredients = []
-            for row in csv_reader:
-                try:
-                    create_ingredients = Ingredient(name=row[0],
-                                                    measurement_unit=row[1],)
-                    ingredients.append(create_ingredients)
-                except ValueError:
-                    print('Несоответствие игнорировано.')
-            Ingredient.objects.bulk_create(ingredients)
-            self.stdout.write(self.style.SUCCESS('Ok'))
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    conflict_fields = ('name', 'measurement_unit')
+    default_file = 'ingredients.csv'
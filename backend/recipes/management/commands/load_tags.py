@@ -1,15 +1,12 @@
-from django.core.management import BaseCommand
-
+from recipes.loaders import LoadCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
-    help = 'Теги'
+class Command(LoadCommand):
+    help = 'Загрузка тегов из CSV или JSON.'
 
-    def handle(self, *args, **kwargs):
-        data = [
-            {'name': 'Завтрак', 'color': '#ffd966', 'slug': 'breakfast'},
-            {'name': 'Обед', 'color': '#4a8685', 'slug': 'lunch'},
-            {'name': 'Ужин', 'color': '#dda3ad', 'slug': 'dinner'}]
-        Tag.objects.bulk_create(Tag(**tag) for tag in data)
-        self.stdout.write(self.style.SUCCESS('Ok'))
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    conflict_fields = ('slug',)
+    update_fields = ('name', 'color')
+    default_file = 'tag.csv'
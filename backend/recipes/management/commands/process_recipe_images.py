@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import (apply_recipe_image, read_upload,
+                            render_recipe_image, store_recipe_image)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создание вариантов картинок для рецептов, у которых их нет, '
+            'и обработка загрузок, потерянных при падении процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=10,
+            help=('Через сколько минут загрузка в статусе pending '
+                  'считается потерянной.')
+        )
+
+    def handle(self, *args, **options):
+        processed = self.create_variants()
+        deadline = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        recovered, failed = self.recover_pending(deadline)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: {processed}, потерянных загрузок обработано {recovered}, '
+            f'с ошибкой {failed}'
+        ))
+
+    def create_variants(self):
+        processed = 0
+        recipes = Recipe.objects.filter(image_variants={}).exclude(
+            image=''
+        ).exclude(image_status=Recipe.ImageStatus.PENDING)
+        for recipe in recipes.only('id', 'image').iterator():
+            try:
+                with recipe.image.open('rb') as image:
+                    image, variants = store_recipe_image(image.read())
+            except OSError as error:
+                self.stderr.write(f'{recipe.image.name}: {error}')
+                continue
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image=image, image_variants=variants
+            )
+            processed += 1
+        return processed
+
+    def recover_pending(self, deadline):
+        """Доделывает загрузки, которые не обработал упавший процесс.
+
+        Рецепт без сохранённого файла ждать нечего: он получает
+        статус ready, если у него осталась прежняя картинка, иначе
+        failed.
+        """
+
+        recovered = failed = 0
+        recipes = Recipe.objects.filter(
+            image_status=Recipe.ImageStatus.PENDING
+        ).only('id', 'image', 'image_upload')
+        for recipe in recipes.iterator():
+            upload = recipe.image_upload
+            if not upload or not default_storage.exists(upload):
+                Recipe.objects.filter(
+                    pk=recipe.pk, image_upload=upload
+                ).update(
+                    image_status=(
+                        Recipe.ImageStatus.READY if recipe.image
+                        else Recipe.ImageStatus.FAILED
+                    ),
+                    image_upload='',
+                )
+                failed += not recipe.image
+                continue
+            if default_storage.get_modified_time(upload) > deadline:
+                continue
+            try:
+                result = render_recipe_image(read_upload(upload))
+            except Exception as error:
+                apply_recipe_image(recipe.pk, upload, error=error)
+                failed += 1
+            else:
+                apply_recipe_image(recipe.pk, upload, result=result)
+                recovered += 1
+        return recovered, failed
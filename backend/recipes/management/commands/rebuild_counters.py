@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Follow, Recipe
+from users.models import User
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк queryset для каждого field."""
+
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, рецептов и подписчиков.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(
+                    FavoriteRecipe.objects.all(), 'recipe'
+                )
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+                followers_count=count_subquery(
+                    Follow.objects.all(), 'author'
+                ),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: рецептов {recipes}, пользователей {users}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = ('Пересборка лент подписок по текущим подпискам и рецептам; '
+            'возвращает в ленты рецепты, раскладка которых потерялась.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            entries = rebuild_feed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: записей в лентах {entries}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт поискового индекса рецептов, например после '
+            'массовых изменений в обход API и админки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        )
+        batch = []
+        total = 0
+        for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+            batch.append(recipe_id)
+            if len(batch) == batch_size:
+                update_search_index(batch)
+                total += len(batch)
+                batch = []
+        update_search_index(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Ok: {total}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import rebuild_similar
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по составу ингредиентов.'
+
+    def handle(self, *args, **options):
+        rows = rebuild_similar()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: похожих рецептов {rows}'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import update_scores
+
+
+class Command(BaseCommand):
+    help = ('Обновление рейтингов popular и trending по новым добавлениям '
+            'в избранное и корзины и удалениям из них. Запускается '
+            'периодически, например из cron раз в несколько минут.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать заново по текущему избранному и корзинам.'
+        )
+
+    def handle(self, *args, **options):
+        created, updated = update_scores(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ok: новых рецептов {created}, изменённых рейтингов {updated}'
+        ))
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:39
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+    Follow = apps.get_model('recipes', 'Follow')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(favorites_count=count_subquery(
+        FavoriteRecipe.objects.all(), 'recipe'
+    ))
+    User.objects.update(
+        recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+        followers_count=count_subquery(Follow.objects.all(), 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_auto_20240117_0236'),
+        ('users', '0006_auto_20261018_0439'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Счётчик добавлений в избранное', verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200, unique=True, verbose_name='Hазвание'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
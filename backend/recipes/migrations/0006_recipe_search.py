@@ -0,0 +1,77 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:43
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=['search_vector'], name='recipe_search_gin'
+)
+
+INGREDIENT_NAMES = (
+    'SELECT {agg} FROM recipes_recipeingredient ri '
+    'JOIN recipes_ingredient i ON i.id = ri.ingredient_id '
+    'WHERE ri.recipe_id = r.id'
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(
+            apps.get_model('recipes', 'Recipe'), SEARCH_INDEX
+        )
+        names = INGREDIENT_NAMES.format(agg="string_agg(i.name, ' ')")
+        schema_editor.execute(
+            'UPDATE recipes_recipe r SET search_vector = '
+            "setweight(to_tsvector('russian', r.name), 'A') || "
+            f"setweight(to_tsvector('russian', COALESCE(({names}), '')), 'B') "
+            "|| setweight(to_tsvector('russian', r.text), 'C')"
+        )
+    elif vendor == 'sqlite':
+        names = INGREDIENT_NAMES.format(agg="group_concat(i.name, ' ')")
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts '
+            'USING fts5(name, ingredients, text)'
+        )
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text) '
+            f"SELECT r.id, r.name, COALESCE(({names}), ''), r.text "
+            'FROM recipes_recipe r'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('recipes', 'Recipe'), SEARCH_INDEX
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_auto_20261018_0439'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=SEARCH_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_follow_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False, help_text='Пути и размеры уменьшенных копий картинки', verbose_name='Варианты картинки'),
+        ),
+    ]
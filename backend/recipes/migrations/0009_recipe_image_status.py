@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Обрабатывается'), ('ready', 'Готова'), ('failed', 'Ошибка обработки')], default='ready', editable=False, max_length=16, verbose_name='Состояние картинки'),
+        ),
+    ]
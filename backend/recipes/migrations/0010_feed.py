@@ -0,0 +1,69 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Ленты по уже существующим подпискам: FEED_BACKFILL_LIMIT последних
+# рецептов автора, кроме авторов с подписчиками больше FEED_FANOUT_LIMIT.
+FILL_FEED = (
+    'INSERT INTO recipes_feedentry '
+    '(follower_id, recipe_id, author_id, pub_date) '
+    'SELECT f.follower_id, r.id, r.author_id, r.pub_date '
+    'FROM recipes_follow f '
+    'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+    'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+    ') AS position FROM recipes_recipe) r ON r.author_id = f.author_id '
+    'JOIN users_user u ON u.id = f.author_id '
+    'WHERE r.position <= 50 AND u.followers_count <= 10000'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_id'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='follower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['follower', '-pub_date', '-recipe'], name='feed_follower_pub_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('follower', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunSQL(FILL_FEED, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_similar_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('model', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Справочник')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+    ]
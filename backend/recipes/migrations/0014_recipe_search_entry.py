@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import recipes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_reference_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchEntry',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='recipes.recipe')),
+                ('document', recipes.models.SearchDocumentField(db_column='recipes_recipe_fts')),
+            ],
+            options={
+                'db_table': 'recipes_recipe_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_search_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_upload',
+            field=models.CharField(blank=True, editable=False, help_text='Исходный файл, пока картинка обрабатывается', max_length=255, verbose_name='Необработанная картинка'),
+        ),
+    ]
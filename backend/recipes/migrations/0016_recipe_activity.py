@@ -0,0 +1,50 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_image_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Рецепт')),
+                ('kind', models.CharField(choices=[('favorite', 'Избранное'), ('shopping', 'Корзина')], max_length=16, verbose_name='Вид')),
+                ('added_at', models.DateTimeField(verbose_name='Дата добавления')),
+                ('delta', models.SmallIntegerField(verbose_name='Изменение')),
+            ],
+            options={
+                'verbose_name': 'Активность по рецепту',
+                'verbose_name_plural': 'Активность по рецептам',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='rankingstate',
+            name='last_favorite',
+        ),
+        migrations.RemoveField(
+            model_name='rankingstate',
+            name='last_recipe',
+        ),
+        migrations.RemoveField(
+            model_name='rankingstate',
+            name='last_shopping',
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_auto_20261018_0439'),
+        ('recipes', '0016_recipe_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='users.user', verbose_name='Пользователь')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия корзины',
+                'verbose_name_plural': 'Версии корзин',
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from api.constant import (LEN_COLOR, MAX_AMOUNT, MAX_LEN_TITLE,
                           MIN_AMOUNT)
@@ -67,9 +70,63 @@ class Tag(models.Model):
         return self.name
 
 
+class ReferenceVersion(models.Model):
+    """Версия справочника, растёт при каждом его изменении.
+
+    Хранится в базе, а не в кэше, чтобы изменение из команды
+    загрузки или другого процесса сразу видели все серверы.
+    """
+
+    model = models.CharField(
+        max_length=100, primary_key=True, verbose_name='Справочник'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0, verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Время изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.model}: {self.version}'
+
+
+class ShoppingCartVersion(models.Model):
+    """Версия корзины пользователя, растёт при каждом её изменении.
+
+    По ней строится ключ готового PDF списка покупок. Хранится в
+    базе и меняется в транзакции изменения, поэтому старый PDF
+    перестают отдавать сразу все серверы.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    version = models.PositiveBigIntegerField(
+        default=0, verbose_name='Версия'
+    )
+
+    class Meta:
+        verbose_name = 'Версия корзины'
+        verbose_name_plural = 'Версии корзин'
+
+
 class Recipe(models.Model):
     """Класс рецепт"""
 
+    class ImageStatus(models.TextChoices):
+        PENDING = 'pending', 'Обрабатывается'
+        READY = 'ready', 'Готова'
+        FAILED = 'failed', 'Ошибка обработки'
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -87,6 +144,26 @@ class Recipe(models.Model):
         upload_to='recipes/images',
         help_text='Картинка',
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты картинки',
+        default=dict,
+        editable=False,
+        help_text='Пути и размеры уменьшенных копий картинки',
+    )
+    image_status = models.CharField(
+        verbose_name='Состояние картинки',
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        editable=False,
+    )
+    image_upload = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name='Необработанная картинка',
+        help_text='Исходный файл, пока картинка обрабатывается',
+    )
     text = models.TextField(
         verbose_name='Описание',
         help_text='Описание рецепта',
@@ -119,16 +196,73 @@ class Recipe(models.Model):
         auto_now_add=True,
         help_text='Дата публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+        editable=False,
+        help_text='Счётчик добавлений в избранное',
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый индекс',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            GinIndex(fields=('search_vector',), name='recipe_search_gin'),
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_id',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5 с именем таблицы, по нему работает MATCH."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class RecipeSearchEntry(models.Model):
+    """Строка FTS5-таблицы recipes_recipe_fts (только SQLite).
+
+    Таблицу создаёт миграция 0006_recipe_search, модель нужна,
+    чтобы поиск присоединял её к рецептам одним JOIN.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column='recipes_recipe_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
+
 class RecipeIngredient(models.Model):
     """Класс рецепт-интредиент"""
 
@@ -202,11 +336,179 @@ class Follow(models.Model):
                 name='unique_follow',
             ),
         ]
+        indexes = [
+            models.Index(fields=('follower', 'id'), name='follow_follower_id'),
+        ]
 
     def __str__(self):
         return f'{self.follower} подписался на: {self.author}'
 
 
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика.
+
+    Лента материализована: новый рецепт раскладывается по лентам
+    подписчиков автора, подписка добавляет рецепты автора, отписка
+    убирает. Дата публикации повторяет рецепт, чтобы страница ленты
+    читалась по индексу без соединения с рецептами.
+    """
+
+    follower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='feed',
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+    )
+    # Записи автора удаляются вместе с его рецептами, поэтому
+    # индекс, ограничение в базе и каскад по автору не нужны.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        verbose_name='Автор',
+        related_name='+',
+        db_index=False,
+        db_constraint=False,
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('follower', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('follower', '-pub_date', '-recipe'),
+                name='feed_follower_pub_date',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.follower}'
+
+
+class RecipeScore(models.Model):
+    """Рейтинг рецепта по избранному и корзинам.
+
+    Каждое добавление весит RANKING_WEIGHTS и затухает с периодом
+    полураспада RANKING_HALF_LIFE. Значения хранятся умноженными на
+    2 ** ((t - epoch) / период), поэтому старые строки не надо
+    пересчитывать: порядок рецептов от этого множителя не зависит.
+    Таблицу дополняет команда update_scores.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='score',
+    )
+    popular = models.FloatField(verbose_name='Популярность', default=0)
+    trending = models.FloatField(verbose_name='Тренд', default=0)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=('-popular', '-recipe'), name='score_popular'
+            ),
+            models.Index(
+                fields=('-trending', '-recipe'), name='score_trending'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.popular:.2f} / {self.trending:.2f}'
+
+
+class RankingState(models.Model):
+    """Состояние update_scores: начало отсчёта рейтингов."""
+
+    epoch = models.DateTimeField(verbose_name='Начало отсчёта')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
+
+
+class RecipeActivity(models.Model):
+    """Добавление в избранное или корзину (delta=1) либо удаление (-1),
+    ещё не учтённое в рейтингах.
+
+    Строки пишут сигналы и пакетные операции api.relations в той же
+    транзакции, что и саму связь, update_scores учитывает их и
+    удаляет. added_at - дата добавления связи, поэтому удаление
+    вычитает ровно тот вклад, который внесло добавление. recipe_id
+    без внешнего ключа: строки удалений пишутся и при каскадном
+    удалении самого рецепта.
+    """
+
+    class Kind(models.TextChoices):
+        FAVORITE = 'favorite', 'Избранное'
+        SHOPPING = 'shopping', 'Корзина'
+
+    recipe_id = models.BigIntegerField(verbose_name='Рецепт')
+    kind = models.CharField(
+        verbose_name='Вид', max_length=16, choices=Kind.choices
+    )
+    added_at = models.DateTimeField(verbose_name='Дата добавления')
+    delta = models.SmallIntegerField(verbose_name='Изменение')
+
+    class Meta:
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, похожий по составу, с местом в списке похожих.
+
+    Списки считает recipes.recommendations: целиком командой
+    rebuild_similar и частично при изменении ингредиентов рецепта.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similar',
+        db_index=False,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+    )
+    score = models.FloatField(verbose_name='Близость')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'rank'), name='unique_similar_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
 class AbstractFavoriteShopping(models.Model):
     """Абстрактный класс избранного и покупок."""
 
@@ -220,6 +522,11 @@ class AbstractFavoriteShopping(models.Model):
         verbose_name='Рецепты',
         on_delete=models.CASCADE,
     )
+    added_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('recipe',)
@@ -0,0 +1,193 @@
+"""Рейтинги рецептов popular и trending.
+
+Вклад связи в избранном или корзине считается от её даты
+добавления (added_at). Добавления и удаления попадают в очередь
+RecipeActivity в той же транзакции, что и сама связь (сигналы
+и пакетные операции api.relations), а update_scores прибавляет
+их к рейтингам и удаляет из очереди. Удаление вычитает ровно то,
+что прибавило добавление, поэтому удалённые связи не остаются
+в рейтинге, а повторные добавления и удаления его не раздувают.
+
+Очередь не зависит от порядка id: строка, которая закоммичена
+позже строки с большим id, просто останется до следующего
+запуска. После перехода с прежних счётчиков по id нужен один
+запуск update_scores --full.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from api.constant import (RANKING_BATCH_SIZE, RANKING_HALF_LIFE,
+                          RANKING_MAX_EXPONENT, RANKING_WEIGHTS)
+from recipes.loaders import batched
+from recipes.models import (FavoriteRecipe, RankingState, RecipeActivity,
+                            RecipeScore, ShoppingCart)
+
+RANKINGS = tuple(RANKING_HALF_LIFE)
+SOURCES = {
+    RecipeActivity.Kind.FAVORITE: FavoriteRecipe,
+    RecipeActivity.Kind.SHOPPING: ShoppingCart,
+}
+INSERT_ACTIVITY = (
+    'INSERT INTO recipes_recipeactivity (recipe_id, kind, added_at, delta) '
+    'VALUES (%s, %s, %s, %s)'
+)
+
+
+def record_activity(kind, rows, delta):
+    """Ставит в очередь добавления (delta=1) или удаления (-1) связей.
+
+    rows - пары (id рецепта, added_at связи) в том виде, в котором
+    их хранит база (connection.ops.adapt_datetimefield_value или
+    значение из RETURNING).
+    """
+
+    rows = list(rows)
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(INSERT_ACTIVITY, [
+            (recipe_id, kind, added_at, delta)
+            for recipe_id, added_at in rows
+        ])
+
+
+def exponents(state, now):
+    seconds = (now - state.epoch).total_seconds()
+    return {
+        ranking: seconds / half_life
+        for ranking, half_life in RANKING_HALF_LIFE.items()
+    }
+
+
+def rebase(state, now):
+    """Переносит начало отсчёта на now, умножая рейтинги на 2 ** -x."""
+
+    RecipeScore.objects.update(**{
+        ranking: F(ranking) * 2 ** -exponent
+        for ranking, exponent in exponents(state, now).items()
+    })
+    state.epoch = now
+
+
+def add_scores(state, activity):
+    """Прибавляет вклад строк (id рецепта, вид, added_at, delta).
+
+    Рецепты, которых уже нет, пропускаются. Возвращает id рецептов.
+    """
+
+    totals = defaultdict(lambda: dict.fromkeys(RANKINGS, 0.0))
+    for recipe_id, kind, added_at, delta in activity:
+        seconds = (added_at - state.epoch).total_seconds()
+        for ranking, half_life in RANKING_HALF_LIFE.items():
+            totals[recipe_id][ranking] += (
+                delta * RANKING_WEIGHTS[kind] * 2 ** (seconds / half_life)
+            )
+    increments = ', '.join(
+        f'{ranking} = recipes_recipescore.{ranking} + excluded.{ranking}'
+        for ranking in RANKINGS
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO recipes_recipescore (recipe_id, '
+            f'{", ".join(RANKINGS)}) '
+            f'SELECT id, {", ".join("%s" for _ in RANKINGS)} '
+            'FROM recipes_recipe WHERE id = %s '
+            f'ON CONFLICT (recipe_id) DO UPDATE SET {increments}',
+            [
+                [scores[ranking] for ranking in RANKINGS] + [recipe_id]
+                for recipe_id, scores in totals.items()
+            ],
+        )
+    return set(totals)
+
+
+def add_new_recipes():
+    """Нулевые рейтинги для рецептов, у которых их ещё нет."""
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO recipes_recipescore (recipe_id, '
+            f'{", ".join(RANKINGS)}) '
+            f'SELECT id, {", ".join("0" for _ in RANKINGS)} '
+            'FROM recipes_recipe r WHERE NOT EXISTS ('
+            'SELECT 1 FROM recipes_recipescore s WHERE s.recipe_id = r.id'
+            ') ON CONFLICT (recipe_id) DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def consume_activity(state):
+    """Учитывает очередь RecipeActivity пачками и удаляет учтённое.
+
+    Берутся только строки, видимые на момент запуска: то, что
+    закоммитят позже, останется до следующего раза.
+    """
+
+    last = RecipeActivity.objects.aggregate(last=Max('pk'))['last'] or 0
+    updated = set()
+    while True:
+        batch = list(RecipeActivity.objects.filter(
+            pk__lte=last
+        ).order_by('pk').values_list(
+            'pk', 'recipe_id', 'kind', 'added_at', 'delta'
+        )[:RANKING_BATCH_SIZE])
+        if not batch:
+            return len(updated)
+        updated |= add_scores(state, [row[1:] for row in batch])
+        RecipeActivity.objects.filter(
+            pk__in=[row[0] for row in batch]
+        ).delete()
+
+
+def rebuild_scores(state):
+    """Считает рейтинги заново по текущему избранному и корзинам."""
+
+    if connection.vendor == 'postgresql':
+        # Новые связи ждут конца пересчёта, иначе их строка в очереди
+        # могла бы удалиться, а сама связь не попасть в пересчёт.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'LOCK TABLE recipes_recipeactivity IN EXCLUSIVE MODE'
+            )
+    RecipeActivity.objects.all().delete()
+    RecipeScore.objects.all().delete()
+    updated = set()
+    for kind, model in SOURCES.items():
+        for batch in batched(
+            model.objects.order_by().values_list(
+                'recipe_id', 'added_at'
+            ).iterator(),
+            RANKING_BATCH_SIZE,
+        ):
+            updated |= add_scores(state, [
+                (recipe_id, kind, added_at, 1)
+                for recipe_id, added_at in batch
+            ])
+    return len(updated)
+
+
+@transaction.atomic
+def update_scores(full=False, now=None):
+    """Добавляет в рейтинги новые рецепты и новую активность.
+
+    Возвращает количество добавленных рецептов и рецептов,
+    рейтинг которых изменился.
+    """
+
+    now = now or timezone.now()
+    state, _ = RankingState.objects.select_for_update().get_or_create(
+        pk=1, defaults={'epoch': now}
+    )
+    if full:
+        state.epoch = now
+        updated = rebuild_scores(state)
+    else:
+        if max(exponents(state, now).values()) > RANKING_MAX_EXPONENT:
+            rebase(state, now)
+        updated = consume_activity(state)
+    created = add_new_recipes()
+    state.save()
+    return created, updated
@@ -0,0 +1,581 @@
+"""Похожие рецепты и рецепты из продуктов корзины.
+
+Рецепты - строки разреженной матрицы рецепт × ингредиент (SciPy
+CSR). Ингредиенты взвешены по IDF, чтобы соль и вода не делали
+похожими всё подряд, строки нормированы, поэтому произведение
+строк - косинусная близость. Для каждого рецепта хранятся
+SIMILAR_RECIPES_TOP_K ближайших (SimilarRecipe), запросы API читают
+только их. Целиком списки собирает rebuild_similar, после изменения
+состава рецепта - update_similar в фоне.
+
+Даже с весами IDF частые ингредиенты делают произведение матрицы
+на себя почти плотным, и пересчёт всех рецептов стал бы
+квадратичным.
+Поэтому кандидаты в похожие ищутся только по редким ингредиентам
+(не больше SIMILAR_RECIPES_MAX_FREQUENCY рецептов), и работа на
+рецепт не растёт с размером базы. Для SIMILAR_RECIPES_CANDIDATES
+лучших кандидатов близость считается по всем ингредиентам. Рецепт
+только из частых ингредиентов похожих не получает. Пачки строк
+ограничены оценкой числа произведений SIMILAR_RECIPES_BLOCK_SIZE,
+строки SimilarRecipe пишутся по мере расчёта.
+
+Матрица кэшируется в процессе вместе с версией похожих
+(ReferenceVersion для SimilarRecipe): её повышают каждый пересчёт
+и удаление рецепта. Пока версия не изменилась чужим процессом,
+update_similar читает из базы только строки изменённых рецептов.
+
+Пересчёты идут по одному (lock_similar): параллельные удаляли бы
+и вставляли одни и те же списки и нарушали unique_similar_rank.
+"""
+import copy
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db import OperationalError, connection, transaction
+from scipy import sparse
+
+from api.constant import (SIMILAR_RECIPES_BATCH_SIZE,
+                          SIMILAR_RECIPES_BLOCK_SIZE,
+                          SIMILAR_RECIPES_CANDIDATES,
+                          SIMILAR_RECIPES_MAX_FREQUENCY,
+                          SIMILAR_RECIPES_RETRIES, SIMILAR_RECIPES_TOP_K)
+from api.utils import reference_version, touch_reference
+from recipes.loaders import batched, insert_rows
+from recipes.models import RecipeIngredient, SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('recipe_id', 'similar_id', 'score', 'rank')
+# Ключ pg_advisory_xact_lock для пересчёта похожих
+SIMILAR_LOCK_KEY = 7_305_201
+
+
+def normalized(rows, columns, idf, shape):
+    """Матрица с весами IDF и строками единичной длины."""
+
+    weights = idf[columns]
+    norms = np.sqrt(
+        np.bincount(rows, weights=weights ** 2, minlength=shape[0])
+    )
+    return sparse.csr_matrix(
+        ((weights / norms[rows]).astype(np.float32), (rows, columns)),
+        shape=shape,
+    )
+
+
+def widened(matrix, width):
+    """Та же CSR, без копии массивов, с width столбцами."""
+
+    return sparse.csr_matrix(
+        (matrix.data, matrix.indices, matrix.indptr),
+        shape=(matrix.shape[0], width),
+    )
+
+
+def row_sums(matrix, values):
+    """Суммы values[столбец] по ненулевым элементам строк matrix."""
+
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    return np.bincount(
+        rows, weights=values[matrix.indices], minlength=matrix.shape[0]
+    )
+
+
+def read_pairs(queryset):
+    return np.array(
+        queryset.order_by().values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+
+def id_list(ids):
+    """Подзапрос со списком id и его единственный параметр."""
+
+    ids = [int(pk) for pk in ids]
+    if connection.vendor == 'postgresql':
+        return 'SELECT unnest(%s::bigint[])', ids
+    return 'SELECT value FROM json_each(%s)', json.dumps(ids)
+
+
+class IngredientMatrix:
+    """Нормированная матрица рецепт × ингредиент.
+
+    Веса IDF и частоты ингредиентов считает load по всей базе.
+    with_recipes перечитывает строки отдельных рецептов: их строки
+    в base гасятся (dead), новые складываются в небольшую extra,
+    а base и её редкая часть общие у всех копий. Когда в extra
+    набирается больше SIMILAR_RECIPES_BATCH_SIZE строк, матрица
+    собирается заново. Номера строк: сначала base, затем extra.
+    """
+
+    def __init__(self, recipe_ids, matrix, columns, idf, frequency):
+        # id рецептов по возрастанию, в порядке строк matrix
+        self.base_ids = recipe_ids
+        self.base = matrix
+        # {id ингредиента: столбец}
+        self.columns = columns
+        self.idf = idf
+        # В скольких рецептах есть ингредиент столбца
+        self.frequency = frequency
+        self.rare = frequency <= SIMILAR_RECIPES_MAX_FREQUENCY
+        self.base_rare = self.rare_part(matrix)
+        self.base_costs = row_sums(self.base_rare, frequency)
+        self.dead = np.zeros(len(recipe_ids), dtype=bool)
+        self.extra_ids = np.zeros(0, dtype=np.int64)
+        self.extra = sparse.csr_matrix(
+            (0, len(columns)), dtype=np.float32
+        )
+        self.extra_rare = self.extra
+        self.extra_costs = np.zeros(0)
+        self.extra_index = {}
+
+    @classmethod
+    def load(cls):
+        pairs = read_pairs(RecipeIngredient.objects.all())
+        recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        ingredient_ids, columns = np.unique(
+            pairs[:, 1], return_inverse=True
+        )
+        frequency = np.bincount(columns, minlength=len(ingredient_ids))
+        idf = np.log((1 + len(recipe_ids)) / (1 + frequency)) + 1
+        return cls(
+            recipe_ids,
+            normalized(
+                rows, columns, idf, (len(recipe_ids), len(ingredient_ids))
+            ),
+            dict(zip(ingredient_ids.tolist(), range(len(ingredient_ids)))),
+            idf,
+            frequency,
+        )
+
+    def rare_part(self, matrix):
+        """matrix только со столбцами редких ингредиентов."""
+
+        part = (matrix @ sparse.diags(self.rare.astype(np.float32))).tocsr()
+        part.eliminate_zeros()
+        return part
+
+    def with_recipes(self, recipe_ids):
+        """Копия матрицы с заново прочитанными строками recipe_ids.
+
+        Рецепты без ингредиентов (и удалённые) из неё пропадают.
+        Новым ингредиентам IDF считается по частоте среди этих строк.
+        Строки остальных рецептов не копируются.
+        """
+
+        recipe_ids = set(recipe_ids)
+        pairs = read_pairs(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        )
+        updated = copy.copy(self)
+        columns = dict(self.columns)
+        frequency = Counter(pairs[:, 1].tolist())
+        added = [
+            ingredient_id for ingredient_id in sorted(frequency)
+            if ingredient_id not in columns
+        ]
+        for ingredient_id in added:
+            columns[ingredient_id] = len(columns)
+        updated.columns = columns
+        updated.idf = np.concatenate([self.idf, [
+            np.log((1 + len(self)) / (1 + frequency[ingredient_id])) + 1
+            for ingredient_id in added
+        ]])
+        updated.frequency = np.concatenate([
+            self.frequency,
+            np.array([frequency[ingredient_id] for ingredient_id in added],
+                     dtype=self.frequency.dtype),
+        ])
+        updated.rare = updated.frequency <= SIMILAR_RECIPES_MAX_FREQUENCY
+        updated.dead = self.dead.copy()
+        updated.dead[self.base_rows(recipe_ids)] = True
+        keep = ~np.isin(self.extra_ids, list(recipe_ids))
+        new_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        fresh = normalized(
+            rows,
+            np.array(
+                [columns[ingredient_id]
+                 for ingredient_id in pairs[:, 1].tolist()],
+                dtype=np.int64,
+            ),
+            updated.idf, (len(new_ids), len(columns)),
+        )
+        updated.extra = sparse.vstack(
+            [widened(self.extra[keep], len(columns)), fresh], format='csr'
+        )
+        updated.extra_ids = np.concatenate([self.extra_ids[keep], new_ids])
+        updated.extra_rare = updated.rare_part(updated.extra)
+        updated.extra_costs = row_sums(
+            updated.extra_rare, updated.frequency
+        )
+        updated.extra_index = {
+            recipe_id: len(self.base_ids) + row
+            for row, recipe_id in enumerate(updated.extra_ids.tolist())
+        }
+        if len(updated.extra_ids) > SIMILAR_RECIPES_BATCH_SIZE:
+            return updated.compacted()
+        return updated
+
+    def compacted(self):
+        """Та же матрица одной CSR, без погашенных строк."""
+
+        alive = np.flatnonzero(~self.dead)
+        recipe_ids = np.concatenate([self.base_ids[alive], self.extra_ids])
+        order = np.argsort(recipe_ids, kind='stable')
+        matrix = sparse.vstack([
+            widened(self.base[alive], len(self.columns)), self.extra,
+        ], format='csr')
+        return IngredientMatrix(
+            recipe_ids[order], matrix[order], self.columns, self.idf,
+            self.frequency,
+        )
+
+    def __len__(self):
+        return int((~self.dead).sum()) + len(self.extra_ids)
+
+    def live_rows(self):
+        return np.concatenate([
+            np.flatnonzero(~self.dead),
+            len(self.base_ids) + np.arange(len(self.extra_ids)),
+        ])
+
+    def base_rows(self, recipe_ids):
+        """Строки base для recipe_ids, которые в ней есть."""
+
+        ids = np.array(sorted(recipe_ids), dtype=np.int64)
+        rows = np.searchsorted(self.base_ids, ids)
+        found = rows < len(self.base_ids)
+        rows, ids = rows[found], ids[found]
+        return rows[self.base_ids[rows] == ids]
+
+    def rows(self, recipe_ids):
+        """Строки матрицы для рецептов, у которых есть ингредиенты."""
+
+        recipe_ids = set(recipe_ids)
+        rows = self.base_rows(recipe_ids)
+        return np.sort(np.concatenate([
+            rows[~self.dead[rows]],
+            np.array(
+                [self.extra_index[recipe_id] for recipe_id in recipe_ids
+                 if recipe_id in self.extra_index],
+                dtype=np.int64,
+            ),
+        ]))
+
+    def pick(self, rows, base, extra):
+        """base[строка] для строк base, extra[строка] для строк extra."""
+
+        rows = np.asarray(rows, dtype=np.int64)
+        in_base = rows < len(self.base_ids)
+        values = np.empty(len(rows), dtype=base.dtype)
+        values[in_base] = base[rows[in_base]]
+        values[~in_base] = extra[rows[~in_base] - len(self.base_ids)]
+        return values
+
+    def ids(self, rows):
+        """id рецептов строк rows."""
+
+        return self.pick(rows, self.base_ids, self.extra_ids)
+
+    def vectors(self, rows, rare=False):
+        """Строки rows одной CSR, в том же порядке."""
+
+        base, extra = (
+            (self.base_rare, self.extra_rare) if rare
+            else (self.base, self.extra)
+        )
+        rows = np.asarray(rows, dtype=np.int64)
+        in_base = rows < len(self.base_ids)
+        stacked = sparse.vstack([
+            widened(base[rows[in_base]], len(self.columns)),
+            extra[rows[~in_base] - len(self.base_ids)],
+        ], format='csr')
+        order = np.argsort(~in_base, kind='stable')
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(rows))
+        return stacked[inverse]
+
+    def similarity(self, rows):
+        """Близость рецептов rows к их кандидатам, без себя самих.
+
+        Разреженная матрица rows × все строки: в строке не больше
+        SIMILAR_RECIPES_CANDIDATES рецептов с общими редкими
+        ингредиентами, близость к ним - по всем ингредиентам.
+        """
+
+        rows = np.asarray(rows, dtype=np.int64)
+        left = self.vectors(rows, rare=True)
+        block = sparse.hstack([
+            left @ widened(self.base_rare, len(self.columns)).T,
+            left @ self.extra_rare.T,
+        ], format='csr')
+        columns = block.indices
+        excluded = columns == np.repeat(rows, np.diff(block.indptr))
+        in_base = columns < len(self.base_ids)
+        excluded[in_base] |= self.dead[columns[in_base]]
+        block.data[excluded] = 0
+        block.eliminate_zeros()
+        pair_rows, pair_columns = [], []
+        for row, start, end in zip(
+            range(len(rows)), block.indptr, block.indptr[1:]
+        ):
+            columns = block.indices[start:end]
+            if len(columns) > SIMILAR_RECIPES_CANDIDATES:
+                columns = columns[np.argpartition(
+                    -block.data[start:end], SIMILAR_RECIPES_CANDIDATES - 1
+                )[:SIMILAR_RECIPES_CANDIDATES]]
+            pair_rows.append(np.full(len(columns), row))
+            pair_columns.append(columns)
+        pair_rows = np.concatenate(pair_rows or [[]]).astype(np.int64)
+        pair_columns = np.concatenate(pair_columns or [[]]).astype(np.int64)
+        scores = np.asarray(
+            self.vectors(rows)[pair_rows].multiply(
+                self.vectors(pair_columns)
+            ).sum(axis=1)
+        ).ravel()
+        return sparse.csr_matrix(
+            (scores, (pair_rows, pair_columns)),
+            shape=(len(rows), len(self.base_ids) + len(self.extra_ids)),
+        )
+
+    def blocks(self, rows):
+        """rows пачками по SIMILAR_RECIPES_BATCH_SIZE строк и не больше
+        SIMILAR_RECIPES_BLOCK_SIZE оценённых произведений."""
+
+        rows = np.asarray(rows, dtype=np.int64)
+        costs = self.pick(rows, self.base_costs, self.extra_costs)
+        start = 0
+        while start < len(rows):
+            total = np.cumsum(
+                costs[start:start + SIMILAR_RECIPES_BATCH_SIZE]
+            )
+            end = start + max(1, int(np.searchsorted(
+                total, SIMILAR_RECIPES_BLOCK_SIZE, side='right'
+            )))
+            yield rows[start:end]
+            start = end
+
+    def top_similar(self, rows):
+        """Строки SimilarRecipe для рецептов rows."""
+
+        for chunk in self.blocks(rows):
+            block = self.similarity(chunk)
+            chunk_ids = self.ids(chunk).tolist()
+            for recipe_id, start, end in zip(
+                chunk_ids, block.indptr, block.indptr[1:]
+            ):
+                columns = block.indices[start:end]
+                scores = block.data[start:end]
+                if len(scores) > SIMILAR_RECIPES_TOP_K:
+                    top = np.argpartition(
+                        -scores, SIMILAR_RECIPES_TOP_K - 1
+                    )[:SIMILAR_RECIPES_TOP_K]
+                    columns, scores = columns[top], scores[top]
+                similar_ids = self.ids(columns)
+                order = np.lexsort((similar_ids, -scores))
+                for rank, index in enumerate(order):
+                    if scores[index] <= 0:
+                        break
+                    yield (
+                        recipe_id, int(similar_ids[index]),
+                        float(scores[index]), rank,
+                    )
+
+
+_cached = None
+
+
+def cached_matrix(version):
+    """Матрица этого процесса, если после неё похожие не менялись."""
+
+    cached = _cached
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    return IngredientMatrix.load()
+
+
+def remember_matrix(matrix, version):
+    """Отмечает пересчёт и после коммита кэширует его матрицу.
+
+    Если версию за это время поменял кто-то ещё (удаление рецепта),
+    матрица не кэшируется: в ней нет этих изменений.
+    """
+
+    global _cached
+
+    def store():
+        global _cached
+        _cached = (version + 1, matrix)
+
+    touch_reference(SimilarRecipe)
+    if reference_version(SimilarRecipe).version == version + 1:
+        transaction.on_commit(store)
+    else:
+        _cached = None
+
+
+def lock_similar():
+    """Ждёт, пока закончатся другие пересчёты похожих.
+
+    Блокировка берётся до чтения данных и держится до конца
+    транзакции. На SQLite её даёт первая запись: транзакции, которые
+    начали с чтения, не смогли бы потом обе перейти к записи, одна
+    сразу получила бы database is locked.
+    """
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)', [SIMILAR_LOCK_KEY]
+            )
+        else:
+            cursor.execute('DELETE FROM recipes_similarrecipe WHERE 1 = 0')
+
+
+def insert_similar(rows):
+    """Пишет строки SimilarRecipe пачками по мере их расчёта."""
+
+    return sum(
+        insert_rows(SimilarRecipe, COLUMNS, batch)
+        for batch in batched(
+            rows, SIMILAR_RECIPES_BATCH_SIZE * SIMILAR_RECIPES_TOP_K
+        )
+    )
+
+
+def last_scores(recipe_ids):
+    """{id рецепта: близость последнего места его списка похожих}."""
+
+    select, ids = id_list(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT recipe_id, score FROM recipes_similarrecipe '
+            f'WHERE rank = %s AND recipe_id IN ({select})',
+            [SIMILAR_RECIPES_TOP_K - 1, ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def write_similar(matrix, recipe_ids):
+    """Заменяет списки похожих для recipe_ids."""
+
+    select, ids = id_list(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM recipes_similarrecipe WHERE recipe_id IN ({select})',
+            [ids],
+        )
+    return insert_similar(matrix.top_similar(matrix.rows(recipe_ids)))
+
+
+@transaction.atomic
+def rebuild_similar():
+    """Считает списки похожих для всех рецептов заново."""
+
+    lock_similar()
+    version = reference_version(SimilarRecipe).version
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE recipes_similarrecipe')
+    else:
+        SimilarRecipe.objects.all().delete()
+    matrix = IngredientMatrix.load()
+    rows = insert_similar(matrix.top_similar(matrix.live_rows()))
+    remember_matrix(matrix, version)
+    return rows
+
+
+def update_similar(recipe_ids):
+    """Обновляет похожие после изменения состава рецептов recipe_ids.
+
+    Если база занята дольше своего таймаута (OperationalError),
+    пересчёт повторяется до SIMILAR_RECIPES_RETRIES раз, кроме
+    вызова внутри чужой транзакции: её уже не повторить.
+    """
+
+    for attempt in range(1, SIMILAR_RECIPES_RETRIES + 1):
+        try:
+            return refresh_similar(recipe_ids)
+        except OperationalError as error:
+            if (attempt == SIMILAR_RECIPES_RETRIES
+                    or connection.in_atomic_block):
+                raise
+            logger.warning(
+                'Пересчёт похожих для %s, попытка %s: %s',
+                recipe_ids, attempt, error,
+            )
+            time.sleep(attempt)
+
+
+@transaction.atomic
+def refresh_similar(recipe_ids):
+    """Один пересчёт для update_similar.
+
+    Пересчитываются списки самих рецептов, списки, в которых они
+    были, и списки, в которые они теперь проходят: близость выше
+    последнего места или список ещё не заполнен. Из базы читаются
+    только строки матрицы recipe_ids (остальное - из кэша процесса,
+    если похожие с тех пор не менялись) и одним запросом последние
+    места их кандидатов. Веса IDF остальных ингредиентов
+    обновит только rebuild_similar.
+    """
+
+    lock_similar()
+    version = reference_version(SimilarRecipe).version
+    matrix = cached_matrix(version).with_recipes(recipe_ids)
+    affected = set(recipe_ids)
+    affected.update(SimilarRecipe.objects.filter(
+        similar_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    changed = matrix.rows(recipe_ids)
+    if len(changed):
+        best = matrix.similarity(changed).max(axis=0).tocoo()
+        candidates = dict(zip(
+            matrix.ids(best.col).tolist(), best.data.tolist()
+        ))
+        thresholds = last_scores(candidates)
+        affected.update(
+            recipe_id for recipe_id, score in candidates.items()
+            if score > thresholds.get(recipe_id, 0)
+        )
+    rows = write_similar(matrix, sorted(affected))
+    remember_matrix(matrix, version)
+    return rows
+
+
+def cook_from_cart(cart_ids, limit):
+    """id рецептов, которые можно приготовить из продуктов корзины.
+
+    Кандидаты - похожие на рецепты корзины. Первыми идут рецепты,
+    большая доля ингредиентов которых уже есть в корзине, при
+    равенстве - более близкие к рецептам корзины.
+    """
+
+    cart_ids = list(cart_ids)
+    if not cart_ids:
+        return []
+    closeness = defaultdict(float)
+    for recipe_id, score in SimilarRecipe.objects.filter(
+        recipe_id__in=cart_ids
+    ).exclude(similar_id__in=cart_ids).values_list('similar_id', 'score'):
+        closeness[recipe_id] += score
+    if not closeness:
+        return []
+    available = set(RecipeIngredient.objects.filter(
+        recipe_id__in=cart_ids
+    ).order_by().values_list('ingredient_id', flat=True))
+    total = Counter()
+    present = Counter()
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=list(closeness)
+    ).order_by().values_list('recipe_id', 'ingredient_id'):
+        total[recipe_id] += 1
+        present[recipe_id] += ingredient_id in available
+    return sorted(closeness, key=lambda recipe_id: (
+        -present[recipe_id] / max(total[recipe_id], 1),
+        -closeness[recipe_id],
+        recipe_id,
+    ))[:limit]
@@ -0,0 +1,100 @@
+"""Полнотекстовый поиск рецептов.
+
+На PostgreSQL рецепт хранит tsvector в Recipe.search_vector
+(GIN-индекс, русская конфигурация), на SQLite индекс живёт
+в виртуальной таблице FTS5 recipes_recipe_fts, которая при поиске
+присоединяется к рецептам через модель RecipeSearchEntry.
+
+Индекс обновляют создание и изменение рецепта через API и админку
+и переименование ингредиентов. Изменения в обход них (bulk_create,
+QuerySet.update(), загрузка напрямую в базу) в индекс не попадают:
+после них нужно вызвать update_search_index для изменённых
+рецептов или команду rebuild_search_index.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, Func, OuterRef, Subquery, Value
+
+from recipes.models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса bm25 для столбцов name, ingredients и text
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def update_search_index(recipe_ids):
+    """Пересчитывает поисковый индекс указанных рецептов."""
+
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        ingredient_names = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(ingredient_names), weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids,
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'SELECT r.id, r.name, COALESCE(('
+                '  SELECT group_concat(i.name, \' \') '
+                '  FROM recipes_recipeingredient ri '
+                '  JOIN recipes_ingredient i ON i.id = ri.ingredient_id '
+                '  WHERE ri.recipe_id = r.id'
+                '), \'\'), r.text '
+                f'FROM recipes_recipe r WHERE r.id IN ({placeholders})',
+                recipe_ids,
+            )
+
+
+def delete_from_search_index(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def fts5_query(value):
+    """Каждое слово запроса ищется по началу, спецсимволы экранируются."""
+
+    words = value.split()
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search_recipes(queryset, value):
+    """Оставляет рецепты, подходящие под запрос, лучшие первыми."""
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    query = fts5_query(value)
+    if not query:
+        return queryset
+    return queryset.filter(search_entry__document__match=query).annotate(
+        search_rank=Func(
+            F('search_entry__document'), *map(Value, BM25_WEIGHTS),
+            function='bm25', output_field=FloatField(),
+        )
+    ).order_by('search_rank', '-pub_date', '-id')
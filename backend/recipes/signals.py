@@ -0,0 +1,106 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.tasks import run_in_background
+from api.utils import touch_reference
+from recipes.feed import fan_out, follow_authors, unfollow_authors
+from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, SimilarRecipe)
+from recipes.ranking import SOURCES, record_activity
+from recipes.search import delete_from_search_index, update_search_index
+from users.models import User
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно изменяет счётчик, не опуская его ниже нуля."""
+
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            'favorites_count', 1
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1
+    )
+
+
+def relation_activity(instance, delta):
+    kind = next(
+        kind for kind, model in SOURCES.items() if isinstance(instance, model)
+    )
+    record_activity(kind, [(
+        instance.recipe_id,
+        connection.ops.adapt_datetimefield_value(instance.added_at),
+    )], delta)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def relation_added(sender, instance, created, **kwargs):
+    if created:
+        relation_activity(instance, 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_removed(sender, instance, **kwargs):
+    relation_activity(instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+        transaction.on_commit(
+            lambda: run_in_background(fan_out, instance.pk)
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+    delete_from_search_index(instance.pk)
+    # Кэш матрицы похожих в процессах не должен предлагать этот рецепт.
+    touch_reference(SimilarRecipe)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'followers_count', 1
+        )
+        follow_authors(instance.follower_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'followers_count', -1
+    )
+    unfollow_authors(instance.follower_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
@@ -14,6 +14,8 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'password',
+        'recipes_count',
+        'followers_count',
     )
     empty_value_display = '--пусто--'
     list_filter = ('username', 'email')
@@ -39,6 +39,16 @@ class User(AbstractUser):
         verbose_name='Пароль',
         max_length=MAX_LEN_PASSWORD,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = 'username', 'first_name', 'last_name'
@@ -50,3 +60,15 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user.remember_auth()
+        return user
+
+    def remember_auth(self):
+        """Пароль и активность из базы, для отзыва JWT (api.signals)."""
+
+        if {'password', 'is_active'} <= self.__dict__.keys():
+            self._stored_auth = self.password, self.is_active